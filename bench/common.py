@@ -0,0 +1,39 @@
+"""Shared helpers for the benchmarks, run them from the repository root e.g. `python bench/extract.py`"""
+import os, sys, time, html
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src", "py"))
+import pmtool
+
+
+def sample_record():
+    """Sample record in PubMed format from the trailing docstring of bin/pmtool.py"""
+    with open(os.path.join(ROOT, "bin", "pmtool.py"), encoding="utf-8") as f:
+        txt = f.read()
+    return txt.split('""" format\n', 1)[1].rsplit('"""', 1)[0].strip()
+
+def corpus(n: int):
+    """Sample record repeated `n` times with distinct PMIDs, PubMed format"""
+    rec = sample_record()
+    return "\n\n".join(rec.replace("31281835", str(10000000 + i), 1) for i in range(n))
+
+def result_page(records: str, count: int, query: str = "sample[ti]"):
+    """PubMed web UI style result page holding records"""
+    chrome = "".join(f'<div class="item-{i}"><a href="/{i}/">Link {i}</a><span>Text {i}</span></div>\n' for i in range(500))
+    return f"""<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{html.escape(query)} - Search Results - PubMed</title>
+<meta name="log_resultcount" content="{count}">
+<meta name="log_processedquery" content="{html.escape(query)}">
+<script>var x = 1;</script></head>
+<body><header>{chrome}</header><main><div class="results-chunks">
+<pre class="search-results-chunk">{html.escape(records.replace(chr(10), chr(13) + chr(10)))}</pre>
+</div></main><footer>{chrome}</footer></body></html>"""
+
+def bench(fn, *args, repeat: int = 5):
+    """Best wall time of `repeat` calls of fn(*args) in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
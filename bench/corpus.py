@@ -0,0 +1,126 @@
+"""Synthetic PubMed format corpus generator
+
+Usage: python bench/corpus.py number-of-records [-o FILE] [--seed SEED]
+Records have a realistic tag mix (several ISSNs, LIDs, authors with ORCIDs and affiliations, structured
+abstracts, MeSH headings with qualifiers, history dates) and values wrapped to continuation lines as
+in PubMed exports. Same seed gives the same corpus. Without -o the corpus is written to stdout.
+"""
+import sys, argparse, random, textwrap
+
+WORDS = ("patients study treatment clinical outcome analysis risk trial cohort disease therapy group "
+    "results effect association response factors cell expression protein model data increased reduced "
+    "significant months years follow-up injury acute chronic surgery diagnostic accuracy sensitivity "
+    "specificity mortality incidence randomized controlled systematic review meta-analysis inflammation "
+    "receptor signaling pathway tumor cancer imaging magnetic resonance reconstruction ligament knee").split()
+LAST = ("Smith", "Müller", "García", "Nguyen", "Kim", "Öztürk", "Rossi", "Dubois", "Johansson", "Kowalski", "Tanaka",
+    "Silva", "Novák", "Gürpınar", "Polat", "Çarkçı", "O'Brien", "van der Berg", "Andersson", "Papadopoulos", "Zhang", "Li")
+FIRST = ("Anna Barış Chen Daniel Elif José Katarzyna Lars María Nikolai Olivia Pierre Sofia Tahsin "
+    "Yusuf Zoë Ahmed Ingrid Kenji Lucía").split()
+PLACES = ("Istanbul, Turkey", "Boston, MA, USA", "Lund, Sweden", "Kyoto, Japan", "Paris, France",
+    "São Paulo, Brazil", "Munich, Germany", "Melbourne, Australia", "Toronto, ON, Canada")
+DEPTS = ("Department of Orthopedics and Traumatology", "Department of Medicine", "Division of Cardiology",
+    "Institute of Molecular Biology", "School of Public Health", "Department of Radiology")
+JOURNALS = (("Biomed Res Int", "BioMed research international", "2314-6141", "101600173"),
+    ("N Engl J Med", "The New England journal of medicine", "1533-4406", "0255562"),
+    ("PLoS One", "PloS one", "1932-6203", "101285081"),
+    ("Knee Surg Sports Traumatol Arthrosc", "Knee surgery, sports traumatology, arthroscopy", "1433-7347", "9314730"))
+PTS = ("Journal Article", "Randomized Controlled Trial", "Review", "Multicenter Study", "Comparative Study",
+    "Research Support, Non-U.S. Gov't", "Systematic Review", "Case Reports")
+MESH = ("Humans", "Female", "Male", "Adult", "Middle Aged", "Aged", "Adolescent", "Young Adult",
+    "Anterior Cruciate Ligament Injuries", "Magnetic Resonance Imaging", "Treatment Outcome",
+    "Retrospective Studies", "Prospective Studies", "Neoplasms", "Risk Factors", "Sensitivity and Specificity")
+QUALIFIERS = ("diagnosis", "surgery", "therapy", "epidemiology", "metabolism", "pathology", "drug therapy")
+HEADINGS = ("BACKGROUND", "OBJECTIVE", "METHODS", "RESULTS", "CONCLUSIONS")
+MONTHS = "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split()
+
+
+def field(tag: str, val: str):
+    """Tag line, long values wrapped to continuation lines indented 6 spaces (trailing space kept as in
+    PubMed exports)"""
+    lines = textwrap.wrap(val, 76, break_long_words=False, break_on_hyphens=False) or [""]
+    return f"{tag.ljust(4)}- " + " \n      ".join(lines)
+
+def sentence(rng: random.Random, lo: int = 8, hi: int = 25):
+    words = rng.choices(WORDS, k=rng.randint(lo, hi))
+    return " ".join(words).capitalize() + "."
+
+def date(rng: random.Random, year: int, sep: str = ""):
+    return f"{year}{sep}{rng.randint(1, 12):02}{sep}{rng.randint(1, 28):02}"
+
+def record(rng: random.Random, pmid: int):
+    """One synthetic record in PubMed format"""
+    year = rng.randint(1995, 2024)
+    ta, jt, issn, jid = rng.choice(JOURNALS)
+    vi, ip, pg = str(rng.randint(1, 400)), str(rng.randint(1, 12)), f"{(p := rng.randint(1, 3000))}-{p + rng.randint(2, 20)}"
+    doi = f"10.{rng.randint(1000, 9999)}/{ta.split()[0].lower()}.{year}.{pmid % 100000}"
+    dp = f"{year} {rng.choice(MONTHS)}"
+    f = [("PMID", str(pmid)), ("OWN", "NLM"), ("STAT", rng.choice(("MEDLINE", "MEDLINE", "PubMed-not-MEDLINE"))),
+        ("DCOM", date(rng, year + 1)), ("LR", date(rng, min(2025, year + rng.randint(1, 5)))),
+        ("IS", f"{issn} (Electronic)")]
+    if rng.random() < 0.6:
+        f.append(("IS", f"{issn[:-1]}{rng.randint(0, 9)} (Print)"))
+    f += [("VI", vi), ("IP", ip), ("DP", dp), ("TI", sentence(rng, 6, 20)), ("PG", pg), ("LID", f"{doi} [doi]")]
+    if rng.random() < 0.4:
+        f.append(("LID", f"S{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}({year}){rng.randint(10000, 99999)} [pii]"))
+    if rng.random() < 0.9:
+        if rng.random() < 0.5:
+            ab = " ".join(f"{h}: " + " ".join(sentence(rng) for _ in range(rng.randint(1, 3))) for h in HEADINGS)
+        else:
+            ab = " ".join(sentence(rng) for _ in range(rng.randint(3, 10)))
+        f.append(("AB", ab))
+        if rng.random() < 0.2:
+            f.append(("CI", f"Copyright © {year} {rng.choice(LAST)} et al."))
+    for _ in range(min(rng.randint(1, 8) * rng.randint(1, 4), 40)):
+        last, first = rng.choice(LAST), rng.choice(FIRST)
+        f += [("FAU", f"{last}, {first}"), ("AU", f"{last} {first[0]}")]
+        if rng.random() < 0.3:
+            f.append(("AUID", f"ORCID: 0000-000{rng.randint(1, 3)}-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}"))
+        for _ in range(rng.choice((0, 1, 1, 1, 2, 3))):
+            f.append(("AD", f"{rng.choice(DEPTS)}, University Hospital, {rng.choice(PLACES)}."))
+    f.append(("LA", "eng"))
+    for _ in range(rng.choice((0, 0, 1, 2, 3))):
+        f.append(("GR", f"R01 {rng.choice('ABCDEFGH')}{rng.randint(100000, 999999)}/NH/NIH HHS/United States"))
+    f += [("PT", pt) for pt in ["Journal Article"] + rng.sample(PTS[1:], rng.randint(0, 2))]
+    f += [("DEP", date(rng, year)), ("PL", rng.choice(PLACES).split(", ")[-1]), ("TA", ta), ("JT", jt), ("JID", jid)]
+    for _ in range(rng.choice((0, 0, 1, 2, 4))):
+        f.append(("RN", f"{rng.randint(0, 9)} ({rng.choice(WORDS).capitalize()} {rng.choice(WORDS)})"))
+    f.append(("SB", "IM"))
+    for mh in sorted(rng.sample(MESH, rng.randint(4, len(MESH)))):
+        star = "*" if rng.random() < 0.2 else ""
+        quals = "".join(f"/{'*' if rng.random() < 0.3 else ''}{q}" for q in rng.sample(QUALIFIERS, rng.choice((0, 0, 1, 2))))
+        f.append(("MH", f"{star}{mh}{quals}"))
+    if rng.random() < 0.4:
+        f.append(("PMC", f"PMC{rng.randint(1000000, 9999999)}"))
+    if rng.random() < 0.3:
+        f += [("OTO", "NOTNLM")] + [("OT", " ".join(rng.choices(WORDS, k=rng.randint(1, 3)))) for _ in range(rng.randint(2, 6))]
+    if rng.random() < 0.3:
+        f.append(("COIS", "The authors declare that there are no conflicts of interest regarding the publication of this paper."))
+    edat = f"{date(rng, year, '/')} 06:00"
+    f += [("EDAT", edat), ("MHDA", f"{date(rng, year + 1, '/')} 06:00"), ("CRDT", edat)]
+    f += [("PHST", f"{date(rng, year - 1, '/')} 00:00 [received]"), ("PHST", f"{date(rng, year, '/')} 00:00 [accepted]"),
+        ("PHST", f"{edat} [entrez]"), ("PHST", f"{edat} [pubmed]")]
+    f += [("AID", f"{doi} [doi]"), ("PST", rng.choice(("ppublish", "epublish", "aheadofprint")))]
+    f.append(("SO", f"{ta}. {dp};{vi}({ip}):{pg}. doi: {doi}."))
+    return "\n".join(field(k, v) for k, v in f)
+
+def generate(n: int, seed: int = 0, start: int = 30000000):
+    """Yield `n` synthetic records with consecutive PMIDs from `start`"""
+    rng = random.Random(seed)
+    for i in range(n):
+        yield record(rng, start + i)
+
+def main(argv):
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("n", type=int, help="number of records")
+    argparser.add_argument("-o", "--output-file", type=str, help="write corpus to file (rather than stdout)")
+    argparser.add_argument("--seed", type=int, help="random seed", default=0)
+    args = argparser.parse_args(argv)
+    of = open(args.output_file, "w", encoding="utf-8") if args.output_file else sys.stdout
+    for i, rec in enumerate(generate(args.n, args.seed)):
+        of.write(f"{chr(10) * 2 if i else ''}{rec}")
+    of.write("\n")
+    if of is not sys.stdout:
+        of.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,31 @@
+"""Compare targeted result page extraction with the BeautifulSoup full parse
+
+Usage: python bench/extract.py [saved-result-page.html ...]
+Without arguments a synthetic result page with 200 records is used.
+"""
+import sys
+from common import pmtool, corpus, result_page, bench
+from bs4 import BeautifulSoup
+
+
+def soup(text):
+    s = BeautifulSoup(text, 'html.parser')
+    return {
+        "resultcount": int(s.select_one("meta[name=log_resultcount]")['content']),
+        "processedquery": s.select_one("meta[name='log_processedquery']")['content'],
+        "records": pmtool._pmchunk(s)
+    }
+
+def main(paths):
+    pages = {p: open(p, encoding="utf-8").read() for p in paths} or {"synthetic (200 records)": result_page(corpus(200), 10000)}
+    for name, text in pages.items():
+        fast = pmtool._pmextract(text)
+        if fast is None:
+            print(f"{name}: markup not recognized by targeted extractor (would fall back to BeautifulSoup)")
+            continue
+        assert fast == soup(text), f"{name}: extractors disagree"
+        tf, ts = bench(pmtool._pmextract, text), bench(soup, text)
+        print(f"{name}: {len(text) / 1024:.0f} KiB, extract {tf * 1000:.2f} ms, BeautifulSoup {ts * 1000:.2f} ms, {ts / tf:.0f}x")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,72 @@
+"""Compare pmformat with the original implementation, markdown rendering of a parsed corpus
+
+Usage: python bench/format.py [number-of-records]
+Synthetic corpus (default 100000 records), rendered once cold and once more with the memoized
+output of the first pass available (as for articles matched by several queries).
+"""
+import sys, re
+from common import pmtool, corpus, bench
+
+
+def reference(article: dict, fmt: str = "md"):
+    """Original pmformat, for output and speed comparison"""
+
+    def stringify(val, sep = ", "):
+        if type(val) == list:
+            return sep.join(val)
+        return val
+
+    if a := article.get('AB'):
+        abstract = "\n" + re.sub(
+            r'(?:^| )([A-Z0-9 ]+:) ',
+            lambda m: f"\n\n**{m.group(1).capitalize()}** ",
+            a
+        ).strip() + "\n"
+    else:
+        abstract = ""
+    txts = []
+    if article.get('PMC'):
+        txts.append(f"https://www.ncbi.nlm.nih.gov/pmc/articles/{article['PMC']}/")
+    if lids := article.get('LID'):
+        if type(lids) != list:
+            lids = [lids]
+        for lid in lids:
+            parts = lid.rsplit(' ', 1)
+            if len(parts) == 1:
+                continue
+            elif parts[1] == '[doi]':
+                txts.append(f"https://doi.org/{parts[0]}")
+            elif parts[1] == '[pii]':
+                txts.append(f"https://linkinghub.elsevier.com/retrieve/pii/{parts[0]}")
+
+    txt =  "  \n".join([f"[Full text]({_url})" for _url in txts])
+    return f"""## {article['TI']}
+
+Publication type: {stringify(article['PT'])}
+{abstract}
+### Information
+
+Date of publication: {stringify(article['DP'])}  
+Source: {stringify(article['SO'], ' | ')}  
+Authors: {', '.join([au['AU'] for au in article['AUS']])}  
+PMID: {article['PMID']}  
+[PubMed entry]({article['URL']})  
+{txt}"""
+
+def render(fn, articles):
+    for a in articles:
+        fn(a)
+
+def main(n: int):
+    articles = pmtool.pmparse(corpus(n))
+    assert all(pmtool.pmformat(a) == reference(a) for a in articles[:1000]), "renderers disagree"
+    pmtool._PMFORMATTED_MAX = n
+    tr = bench(render, reference, articles, repeat=1)
+    pmtool._pmformatted.clear()
+    tc = bench(render, pmtool.pmformat, articles, repeat=1)
+    tm = bench(render, pmtool.pmformat, articles, repeat=1)
+    print(f"{n} records, reference {n / tr:.0f} records/s, pmformat {n / tc:.0f} records/s ({tr / tc:.1f}x), "
+        f"memoized {n / tm:.0f} records/s ({tr / tm:.1f}x)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,30 @@
+"""Memory held per record by article dicts vs. compact `PMArticle` objects
+
+Usage: python bench/memory.py [file-in-pubmed-format]
+Without arguments a synthetic corpus of 20000 records is used.
+"""
+import sys, tracemalloc
+from common import pmtool, corpus
+
+
+def held(txt: str, compact: bool):
+    """Bytes allocated by the list of parsed records, and number of records"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    articles = list(pmtool.pmparse_iter(txt, compact=compact))
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, len(articles)
+
+def main(paths):
+    if paths:
+        with open(paths[0], encoding="utf-8") as f:
+            txt = f.read().strip()
+    else:
+        txt = corpus(20000)
+    d, n = held(txt, False)
+    c, _ = held(txt, True)
+    print(f"{n} records, dict {d / n:.0f} bytes/record, PMArticle {c / n:.0f} bytes/record, {d / c:.1f}x")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
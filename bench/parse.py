@@ -0,0 +1,63 @@
+"""Compare pmparse_iter with the original split/re.sub/re.findall implementation of pmparse
+
+Usage: python bench/parse.py [file-in-pubmed-format]
+Without arguments a synthetic corpus of 20000 records is used.
+"""
+import sys, re
+from common import pmtool, corpus, bench
+
+
+def reference(input: str):
+    """Original pmparse, for output and speed comparison"""
+    articles = []
+    for iarticle in input.split('\n\n'):
+        iarticle = re.sub('[ ]\n[ ]+', ' ', iarticle)
+        oarticle = {}
+        authors = []
+        for key, val in re.findall(r'^([A-Z]+)\s*- (.*?)$', iarticle, flags=re.MULTILINE):
+
+            def add(dest, k, v):
+                if not dest.get(k):
+                    dest[k] = v
+                elif type(dest[k]) != list:
+                    dest[k] = [dest[k], val]
+                else:
+                    dest[k].append(val)
+
+            if key == 'FAU':
+                authors.append({'FAU': val})
+            elif key == 'AU':
+                authors[-1]['AU'] = val
+            elif key == 'AUID':
+                authors[-1]['AUID'] = val
+            elif key == 'AD':
+                if not authors[-1].get('AD'):
+                    authors[-1]['AD'] = []
+                authors[-1]['AD'].append(val)
+            else:
+                add(oarticle, key, val)
+
+        oarticle['AUS'] = authors
+        oarticle['URL'] = f"https://pubmed.ncbi.nlm.nih.gov/{oarticle['PMID']}/"
+        articles.append(oarticle)
+    return articles
+
+def current(input: str):
+    """Consume pmparse_iter the way the CLI does, one article at a time"""
+    for _ in pmtool.pmparse_iter(input):
+        pass
+
+def main(paths):
+    if paths:
+        with open(paths[0], encoding="utf-8") as f:
+            txt = f.read().strip()
+    else:
+        txt = corpus(20000)
+    n = len(reference(txt))
+    assert list(pmtool.pmparse_iter(txt)) == reference(txt), "parsers disagree"
+    tr, tc = bench(reference, txt, repeat=3), bench(current, txt, repeat=3)
+    print(f"{n} records, reference {n / tr:.0f} records/s, pmparse_iter {n / tc:.0f} records/s, {tr / tc:.1f}x"
+        f" ({'meets' if tr / tc >= 3 else 'short of'} the 3x target)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,49 @@
+"""JSON output throughput and peak memory, whole list json.dumps vs. streaming `pmwrite`, per backend
+
+Usage: python bench/serialize.py [number-of-records]
+Each case runs in its own process on a synthetic corpus (default 50000 records, a multiple of 1000), peak RSS is the
+growth of the process high-water mark during serialization (parsed records already in memory).
+"""
+import sys, time, json, resource, subprocess
+from common import pmtool, corpus
+
+
+class Null:
+    """Output file that only counts characters"""
+    def __init__(self):
+        self.n = 0
+
+    def write(self, s):
+        self.n += len(s)
+
+def child(case: str, backend: str, n: int):
+    # Parse in small pieces so the corpus text does not raise the RSS high-water mark
+    rec = corpus(1000)
+    articles = [a for _ in range(n // 1000) for a in pmtool.pmparse(rec)]
+    pmtool.pmjson(backend)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    if case == "dumps":
+        out = Null()
+        out.write(pmtool._dumps(articles))
+    else:
+        out = Null()
+        pmtool.pmwrite(out, iter(articles), "json")
+    t = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    print(json.dumps({"time": t, "chars": out.n, "peak": peak}))
+
+def main(n: int):
+    backends = ["json"] + (["orjson"] if pmtool.orjson else [])
+    for backend in backends:
+        for case in ("dumps", "pmwrite"):
+            r = json.loads(subprocess.run([sys.executable, __file__, "--child", case, backend, str(n)],
+                capture_output=True, text=True, check=True).stdout)
+            print(f"{backend:6} {case:7}: {n / r['time']:8.0f} records/s, {r['chars'] / r['time'] / 1e6:6.1f} MB/s, "
+                f"peak RSS +{r['peak'] / 1024:.0f} MB")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,174 @@
+"""Local stand-in for PubMed, serving web UI result pages and E-utilities esearch/efetch responses
+
+Usage: python bench/server.py [--port PORT] [-n number-of-records | --corpus FILE] [--pages DIR] [--delay SECONDS]
+           [--fail-rate RATE [--fail-status STATUS] [--retry-after SECONDS]]
+       python bench/server.py --record QUERY [--pages DIR] [--number-of-pages N]
+Every query matches the whole corpus (synthetic, see corpus.py, or PubMed format file), except queries
+of PMIDs only which match those records. Result pages recorded from PubMed with --record (saved in
+--pages, default bench/pages) are served for the query, page size, page and format they were recorded
+for. A share of requests (--fail-rate) can be failed with an HTTP status or, with status 0, by
+closing the connection, to exercise retries. Point pmtool at the server with PMTOOL_PUBMED_URL and
+PMTOOL_EUTILS_URL set to its URL.
+"""
+import os, sys, json, time, random, hashlib, argparse, threading, urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from common import ROOT, pmtool, result_page
+from corpus import generate
+
+PAGES = os.path.join(ROOT, "bench", "pages")
+
+
+def page_file(pages: str, term: str, size: int, page: int, fmt: str):
+    """Path of recorded result page"""
+    key = pmtool.PMCache.key(term, size, page, fmt)
+    return os.path.join(pages, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".html")
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        pm = self.server.pm
+        with pm.lock:
+            pm.requests += 1
+        if pm.delay:
+            time.sleep(pm.delay)
+        if pm.failing():
+            if not pm.fail_status:
+                self.close_connection = True # No response, client sees a connection error
+                return
+            self.send_response(pm.fail_status)
+            if pm.retry_after is not None:
+                self.send_header("Retry-After", str(pm.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        url = urllib.parse.urlparse(self.path)
+        q = {k: v[0] for k, v in urllib.parse.parse_qs(url.query).items()}
+        if url.path.endswith("esearch.fcgi"):
+            recs = pm.select(q["term"])
+            with pm.lock:
+                pm.history.append(recs)
+                key = str(len(pm.history))
+            body = json.dumps({"esearchresult": {"count": str(len(recs)), "webenv": "MCID_local",
+                "querykey": key, "querytranslation": q["term"]}})
+        elif url.path.endswith("efetch.fcgi"):
+            if "id" in q:
+                recs = [pm.byid[p] for p in q["id"].split(",") if p in pm.byid]
+            else:
+                start, key = int(q.get("retstart", 0)), int(q.get("query_key", 0))
+                recs = pm.history[key - 1][start:start + int(q.get("retmax", 20))] if 0 < key <= len(pm.history) else []
+            body = "\n".join(r.split("\n", 1)[0][6:] for r in recs) if q.get("rettype") == "uilist" else "\n" + "\n\n".join(recs) + "\n"
+        else:
+            term, size, page, fmt = q.get("term", ""), int(q.get("size", 10)), int(q.get("page", 1)), q.get("format", "summary")
+            if pm.pages and os.path.exists(path := page_file(pm.pages, term, size, page, fmt)):
+                with open(path, encoding="utf-8") as f:
+                    body = f.read()
+            else:
+                recs = pm.select(term)
+                chunk = recs[(page - 1) * size:page * size]
+                body = result_page("\n".join(r.split("\n", 1)[0][6:] for r in chunk) if fmt == "pmid" else "\n\n".join(chunk), len(recs), term)
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class PMServer:
+    """PubMed stand-in on a background thread serving `records` (PubMed format texts), and result
+    pages recorded in `pages` if given, at `url`. Each response is delayed `delay` seconds (to
+    simulate network latency), served requests are counted in `requests`. The next `fail_next`
+    requests and a `fail_rate` share of the others fail with `fail_status` (0 closes the connection)
+    and a Retry-After header if `retry_after` is given, failed requests are counted in `failures`"""
+
+    def __init__(self, records, pages: str = None, port: int = 0, delay: float = 0, fail_rate: float = 0,
+            fail_status: int = 503, retry_after: int = None, seed: int = 0):
+        self.records = list(records)
+        self.byid = {r.split("\n", 1)[0][6:]: r for r in self.records}
+        self.history = [] # Records selected by esearch, by query key - 1
+        self.pages = pages
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.fail_next = 0
+        self.failures = 0
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.pm = self
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/"
+
+    def failing(self):
+        """Whether to fail the current request"""
+        with self.lock:
+            if fail := self.fail_next > 0 or self.rng.random() < self.fail_rate:
+                self.fail_next = max(0, self.fail_next - 1)
+                self.failures += 1
+            return fail
+
+    def select(self, term: str):
+        """Records matching query, the PMIDs of a PMID only query or all"""
+        if (pmids := term.split()) and all(p.isdigit() for p in pmids):
+            return [self.byid[p] for p in pmids if p in self.byid]
+        return self.records
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start() # Short poll, quick close
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+def record(query: str, pages: str, n: int):
+    """Save the first `n` result pages (PubMed format, 200 records per page) of query from PubMed"""
+    os.makedirs(pages, exist_ok=True)
+    client = pmtool.PMClient(1, rate=1)
+    for page in range(1, n + 1):
+        text = client.get(f"{pmtool.PUBMED_URL}?term={urllib.parse.quote(query)}&size=200&format=pubmed&page={page}").text
+        with open(page_file(pages, query, 200, page, "pubmed"), "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Recorded page {page} of {query}", file=sys.stderr)
+
+def main(argv):
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--port", type=int, help="port to listen on", default=8765)
+    argparser.add_argument("-n", "--number", type=int, help="number of synthetic records", default=10000)
+    argparser.add_argument("--corpus", type=str, help="serve records of this PubMed format file (rather than synthetic)")
+    argparser.add_argument("--pages", type=str, help="directory of recorded result pages", default=PAGES)
+    argparser.add_argument("--delay", type=float, help="delay of each response in seconds", default=0)
+    argparser.add_argument("--fail-rate", type=float, help="share of requests to fail", default=0)
+    argparser.add_argument("--fail-status", type=int, help="HTTP status of failed requests, 0 to close the connection", default=503)
+    argparser.add_argument("--retry-after", type=int, help="Retry-After header of failed requests in seconds")
+    argparser.add_argument("--record", type=str, help="record result pages of this query from PubMed (rather than serve)")
+    argparser.add_argument("--number-of-pages", type=int, help="number of result pages to record", default=1)
+    args = argparser.parse_args(argv)
+    if args.record:
+        record(args.record, args.pages, args.number_of_pages)
+        return
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            records = list(pmtool._pmrecords(f))
+    else:
+        records = generate(args.number)
+    server = PMServer(records, args.pages, args.port, args.delay, args.fail_rate, args.fail_status, args.retry_after)
+    print(f"Serving {len(server.records)} records at {server.url}", file=sys.stderr)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,69 @@
+"""Cold start cost of the offline conversion path, import time (-X importtime) and wall time
+
+Usage: python bench/startup.py [runs]
+Import time of pmtool is the median of `runs` (default 20) fresh interpreters, with the largest imports
+it pulls in. Wall time is the best of `runs` conversions of one record to markdown, less the bare
+interpreter start. Also checks that the offline path does not import the network and HTML dependencies.
+"""
+import sys, os, subprocess, statistics, time, tempfile
+from common import ROOT, sample_record
+
+SRC = os.path.join(ROOT, "src", "py")
+NETWORK = ("requests", "bs4", "concurrent.futures")
+
+
+def importtime(code: str):
+    """(module, depth, self us, cumulative us) in -X importtime order (nested imports before the importer)
+    of one fresh interpreter running code"""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {SRC!r}); {code}"],
+        capture_output=True, text=True).stderr
+    times = []
+    for line in err.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            self_us, cum_us, name = line.split(":", 1)[1].split("|")
+            times.append((name.strip(), (len(name) - len(name.lstrip()) - 1) // 2, int(self_us), int(cum_us)))
+    return times
+
+def after(times: list, module: str):
+    """Cumulative us of top level imports following (done by code run after importing) module"""
+    names = [t[0] for t in times]
+    return sum(t[3] for t in times[names.index(module) + 1:] if t[1] == 0)
+
+def children(times: list, module: str):
+    """Direct imports of top level module as (cumulative us, name), largest first"""
+    i, out = [t[0] for t in times].index(module) - 1, []
+    while i >= 0 and times[i][1] > 0:
+        if times[i][1] == 1:
+            out.append((times[i][3], times[i][0]))
+        i -= 1
+    return sorted(out, reverse=True)
+
+def wall(args: list, runs: int):
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable] + args, check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main(runs: int):
+    offline = [importtime("import pmtool") for _ in range(runs)]
+    network = [importtime("import pmtool; pmtool._pmnetimports()") for _ in range(runs)]
+    cum = statistics.median(t[3] for times in offline for t in times if t[0] == "pmtool") / 1000
+    net = statistics.median(after(times, "pmtool") for times in network) / 1000
+    print(f"import pmtool: {cum:.1f} ms (network dependencies, loaded for -q: {net:.1f} ms more)")
+    print("largest imports of pmtool: " + ", ".join(f"{name} {us / 1000:.1f} ms" for us, name in children(offline[-1], "pmtool")[:8]))
+    loaded = [m for m in NETWORK if m in {t[0] for t in offline[-1]}]
+    print(f"network/HTML dependencies imported by offline path: {', '.join(loaded) or 'none'}")
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+        f.write(sample_record())
+    try:
+        base = wall(["-c", "pass"], runs)
+        conv = wall([os.path.join(SRC, "pmtool.py"), "-i", f.name, "-o", os.devnull], runs)
+    finally:
+        os.unlink(f.name)
+    print(f"convert one record: {conv * 1000:.1f} ms wall, {(conv - base) * 1000:.1f} ms over bare interpreter ({base * 1000:.1f} ms)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
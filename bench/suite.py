@@ -0,0 +1,101 @@
+"""Benchmark suite of parsing, formatting, JSON output and the query loop on a synthetic corpus
+
+Usage: python -m pytest bench/suite.py [--benchmark-autosave | --benchmark-compare ...] (requires pytest-benchmark)
+       python bench/suite.py (without pytest-benchmark, prints best of 5 times)
+Saved pytest-benchmark runs can be compared to catch performance regressions. The query loop runs
+against a local server (see server.py) with 20 ms response delay, so it measures the pipeline
+(concurrency, extraction, parsing) rather than PubMed. The replay case queries the result page kept
+in bench/pages, whose markup follows PubMed's rather than the synthetic pages of the server.
+"""
+from common import pmtool, bench
+from corpus import generate
+from server import PMServer, PAGES
+
+N = 2000 # Records in corpus
+CORPUS = "\n\n".join(generate(N, seed=1))
+ARTICLES = list(pmtool.pmparse_iter(CORPUS))
+QUERIES = [f"query{i}" for i in range(8)]
+REPLAY = "anterior cruciate ligament[ti] AND reconstruction[ti]" # Query of the page in bench/pages
+
+
+class Null:
+    """Output file that discards output"""
+    def write(self, s):
+        pass
+
+def parse():
+    return sum(1 for _ in pmtool.pmparse_iter(CORPUS))
+
+def parse_compact():
+    return sum(1 for _ in pmtool.pmparse_iter(CORPUS, compact=True))
+
+def format_md():
+    pmtool._pmformatted.clear() # Cold, no memoized output
+    return [pmtool.pmformat(a) for a in ARTICLES]
+
+def write_json():
+    pmtool.pmwrite(Null(), iter(ARTICLES), "json")
+
+def query_loop(server, engine: str = "web"):
+    """Run QUERIES (each matching the whole corpus) without cache, consuming all parsed articles"""
+    pmtool.PUBMED_URL = pmtool.EUTILS_URL = server.url
+    n = 0
+    for r in pmtool.pmqueries(QUERIES, 1000, client=pmtool.PMClient(8), engine=engine):
+        n += sum(1 for _ in pmtool.pmparse_iter(r['result']))
+    assert n == len(QUERIES) * 1000
+    return n
+
+def replay(server):
+    """Run REPLAY (served from the page in bench/pages) without cache"""
+    pmtool.PUBMED_URL = server.url
+    r = pmtool.pmquery(REPLAY, client=pmtool.PMClient(1))
+    assert [a['PMID'] for a in pmtool.pmparse_iter(r['result'])] == ["31281835", "31281900", "31281901"]
+    return r
+
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+if pytest:
+    @pytest.fixture(scope="module")
+    def server():
+        with PMServer(CORPUS.split("\n\n"), delay=0.02) as s:
+            yield s
+
+    def test_pmparse(benchmark):
+        assert benchmark(parse) == N
+
+    def test_pmparse_compact(benchmark):
+        assert benchmark(parse_compact) == N
+
+    def test_pmformat(benchmark):
+        benchmark(format_md)
+
+    def test_json_output(benchmark):
+        benchmark(write_json)
+
+    def test_query_loop(benchmark, server):
+        benchmark.pedantic(query_loop, args=(server,), rounds=3)
+
+    def test_query_loop_eutils(benchmark, server):
+        benchmark.pedantic(query_loop, args=(server, "eutils"), rounds=3)
+
+    def test_replay(benchmark):
+        with PMServer([], PAGES) as s:
+            benchmark(replay, s)
+
+def main():
+    print(f"Synthetic corpus of {N} records, {len(CORPUS) / 1e6:.1f} MB")
+    for name, fn in (("pmparse", parse), ("pmparse compact", parse_compact), ("pmformat", format_md), ("json output", write_json)):
+        t = bench(fn)
+        print(f"{name}: {t * 1000:.1f} ms, {N / t:.0f} records/s")
+    with PMServer(CORPUS.split("\n\n"), delay=0.02) as server:
+        for engine in ("web", "eutils"):
+            t = bench(query_loop, server, engine, repeat=3)
+            print(f"query loop ({engine}, {len(QUERIES)} queries of 1000 records): {t * 1000:.1f} ms, {server.requests} requests")
+    with PMServer([], PAGES) as server:
+        print(f"replay of recorded page: {bench(replay, server) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
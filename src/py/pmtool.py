@@ -1,93 +1,1131 @@
-import sys, argparse, json, os, re, math, requests, time, random
-from bs4 import BeautifulSoup
+import sys, argparse, json, os, re, math, time, threading, sqlite3, zlib, html, mmap, struct, bisect, gzip, bz2, io
+from array import array
+from collections import deque, OrderedDict
+from contextlib import nullcontext
+from urllib.parse import quote
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
+PUBMED_URL = os.environ.get("PMTOOL_PUBMED_URL", "https://pubmed.ncbi.nlm.nih.gov/") # Override e.g. for local test server
+EUTILS_URL = os.environ.get("PMTOOL_EUTILS_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/") # Override e.g. for local mock server
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "pmtool")
 
-def pmquery(q: str, rmax: int = -1):
-    """Query PubMed"""
+
+def pmjson(backend: str = "auto"):
+    """Select JSON backend for output and record store, "orjson", "json" (standard library) or "auto"
+    (orjson if installed). Return name of selected backend"""
+    global _jsonbackend, _dumps, _loads, _jsonseps
+    if backend == "orjson" and not orjson:
+        raise ImportError("orjson JSON backend requires orjson (pip install orjson)")
+    if backend != "json" and orjson:
+        _jsonbackend, _dumps, _loads = "orjson", lambda o: orjson.dumps(o).decode("utf-8"), orjson.loads
+        _jsonseps = (",", ":") # Item and key separators of the backend, for JSON written around its output
+    else:
+        _jsonbackend, _dumps, _loads = "json", json.dumps, json.loads
+        _jsonseps = (", ", ": ")
+    return _jsonbackend
+
+pmjson()
+
+
+class PMStats:
+    """Wall time and item count per pipeline stage of a run (see `--stats`). Stages timed on the main
+    thread with `enter`/`exit` or `iter` nest, time is counted to the innermost stage only. `add`
+    sums time of stages run on worker threads (so the total may exceed wall time)"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.times = {} # stage: seconds
+        self.counts = {} # stage: items
+        self.stack = [] # [stage, start, seconds in nested stages] of entered stages
+        self.lock = threading.Lock()
+
+    def enter(self, stage: str):
+        self.stack.append([stage, time.perf_counter(), 0.0])
+
+    def exit(self, n: int = 0):
+        """Leave innermost stage, counting `n` items"""
+        stage, t0, nested = self.stack.pop()
+        t = time.perf_counter() - t0
+        if self.stack:
+            self.stack[-1][2] += t
+        self.add(stage, t - nested, n)
+
+    def add(self, stage: str, seconds: float, n: int = 1):
+        """Add time and items to stage (thread safe)"""
+        with self.lock:
+            self.times[stage] = self.times.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + n
+
+    def iter(self, items, stage: str):
+        """Yield from iterable, timing and counting each item produced to `stage`"""
+        it = iter(items)
+        while True:
+            self.enter(stage)
+            try:
+                item = next(it)
+            except StopIteration:
+                self.exit()
+                return
+            except BaseException:
+                self.exit()
+                raise
+            self.exit(1)
+            yield item
+
+    def report(self, **counters):
+        """Dict of wall time, stages (seconds, items, items per second), `counters` and peak RSS in MB"""
+        try:
+            import resource
+            kb = 1 if sys.platform == "darwin" else 1024 # ru_maxrss is in bytes on macOS
+            rss = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)) * kb / 1e6
+        except ImportError:
+            rss = None
+        return {
+            "wall": round(time.perf_counter() - self.start, 3),
+            "stages": {k: {"seconds": round(t, 3), "items": self.counts[k], "per second": round(self.counts[k] / t) if t > 0 and self.counts[k] else None}
+                for k, t in self.times.items()},
+            "counters": counters,
+            "peak rss mb": round(rss, 1) if rss is not None else None
+        }
+
+    @staticmethod
+    def table(report: dict):
+        """Report as plain text table"""
+        lines = [f"{'stage':<16}{'seconds':>10}{'items':>10}{'per second':>12}"]
+        for k, s in report["stages"].items():
+            lines.append(f"{k:<16}{s['seconds']:>10.3f}{s['items']:>10}{s['per second'] if s['per second'] is not None else '':>12}")
+        lines.append(f"{'wall':<16}{report['wall']:>10.3f}")
+        lines += [f"{k}: {v}" for k, v in report["counters"].items()]
+        lines.append(f"peak RSS: {report['peak rss mb']} MB")
+        return "\n".join(lines)
+
+_stats = None # PMStats of the run if enabled, stages are then timed
+
+requests = ThreadPoolExecutor = random = None # Bound by _pmnetimports
+
+def _pmnetimports():
+    """Import network dependencies on first use (by `PMClient`), so local file conversion starts
+    without them"""
+    global requests, ThreadPoolExecutor, random
+    import requests, random
+    from concurrent.futures import ThreadPoolExecutor
+
+class TokenBucket:
+    """Thread safe token bucket rate limiter, `rate` requests per second with bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: float = 0):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class PMClient:
+    """Pooled keep-alive HTTP session with rate limit, timeout and retries with jittered exponential
+    backoff on connection errors, 429 and 5xx. Counters in `stats`"""
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, pool: int = 8, rate: float = 0, timeout: float = 30, retries: int = 5, backoff: float = 0.5, backoff_max: float = 30):
+        _pmnetimports()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.limiter = TokenBucket(rate) if rate > 0 else None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.stats = {"requests": 0, "retries": 0, "errors": 0, "bytes": 0, "latency": 0.0}
+        self.lock = threading.Lock()
+
+    def count(self, **kwargs):
+        """Add to counters"""
+        with self.lock:
+            for k, v in kwargs.items():
+                self.stats[k] += v
+
+    def get(self, url: str):
+        """GET url, retrying transient failures, raise on final failure"""
+        for attempt in range(self.retries + 1):
+            if self.limiter:
+                self.limiter.acquire()
+            t0 = time.perf_counter()
+            try:
+                r = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self.count(requests=1, errors=1, latency=time.perf_counter() - t0)
+                if attempt == self.retries:
+                    raise
+                delay = 0
+            else:
+                self.count(requests=1, bytes=len(r.content), latency=time.perf_counter() - t0)
+                if r.status_code >= 400:
+                    self.count(errors=1)
+                if r.status_code not in self.RETRY_STATUS or attempt == self.retries:
+                    r.raise_for_status()
+                    return r
+                delay = float(ra) if (ra := r.headers.get("Retry-After", "")).isdigit() else 0
+            self.count(retries=1)
+            # Full jitter exponential backoff, but at least what the server asked for
+            time.sleep(max(delay, random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))))
+
+class PMCache:
+    """SQLite cache of query result pages with time to live and LRU eviction when above `max_size`
+    bytes. Thread safe, `refresh` ignores (but replaces) existing entries. Counters in `stats`"""
+
+    def __init__(self, path: str, ttl: float = 86400, max_size: int = 256 * 1024 * 1024, refresh: bool = False):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, resultcount INTEGER,
+            processedquery TEXT, records BLOB, size INTEGER, created REAL, accessed REAL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_created ON pages (created)")
+        self.ttl = ttl
+        self.max_size = max_size
+        self.refresh = refresh
+        self.puts = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(q: str, qsize: int, page: int, fmt: str = "pubmed"):
+        """Cache key of result page, query normalized on whitespace"""
+        return f"{' '.join(q.split())}\x00{qsize}\x00{page}\x00{fmt}"
+
+    def get(self, key: str):
+        """Return cached page dict or None if missing or expired"""
+        with self.lock:
+            row = None if self.refresh else self.db.execute(
+                "SELECT resultcount, processedquery, records, created FROM pages WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if not row or now - row[3] > self.ttl:
+                self.stats["misses"] += 1
+                return None
+            self.db.execute("UPDATE pages SET accessed = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+        return {"resultcount": row[0], "processedquery": row[1], "records": zlib.decompress(row[2]).decode("utf-8")}
+
+    PURGE_EVERY = 64 # Puts between expiry and eviction runs, the cache may exceed max size by this many pages
+
+    def put(self, key: str, page: dict):
+        """Store page dict, every `PURGE_EVERY` puts also remove expired entries and evict least
+        recently used entries if above max size"""
+        blob = zlib.compress(page["records"].encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, page["resultcount"], page["processedquery"], blob, len(blob), now, now))
+            self.puts += 1
+            if self.puts % self.PURGE_EVERY == 1:
+                self.purge(now)
+
+    def purge(self, now: float):
+        """Remove expired entries, then least recently used ones until at most max size (lock held)"""
+        self.db.execute("DELETE FROM pages WHERE created < ?", (now - self.ttl,))
+        if (total := self.db.execute("SELECT TOTAL(size) FROM pages").fetchone()[0]) <= self.max_size:
+            return
+        evict = []
+        for k, size in self.db.execute("SELECT key, size FROM pages ORDER BY accessed"):
+            evict.append((k,))
+            if (total := total - size) <= self.max_size:
+                break
+        self.db.execute("BEGIN")
+        self.db.executemany("DELETE FROM pages WHERE key = ?", evict)
+        self.db.execute("COMMIT")
+        self.stats["evictions"] += len(evict)
+
+    def close(self):
+        self.db.close()
+
+def _pmchunk(s):
+    """Extract PubMed format records from parsed result page"""
+    if pre := s.select_one('pre.search-results-chunk'):
+        return pre.text.replace("\r\n", "\n").strip()
+    return ""
+
+_PMMETA = re.compile(r'<meta\s[^>]*?name=["\']?(log_resultcount|log_processedquery)["\'\s>][^>]*>', re.I)
+_PMCONTENT = re.compile(r'\scontent=(?:"([^"]*)"|\'([^\']*)\')', re.I)
+_PMPRE = re.compile(r'<pre\s[^>]*?class=["\'][^"\']*\bsearch-results-chunk\b[^>]*>', re.I)
+
+def _pmextract(text: str):
+    """Extract result count, processed query and records from result page with regular expressions
+    rather than a full parse, None if the markup is not as expected"""
+    meta = {}
+    for m in _PMMETA.finditer(text):
+        if c := _PMCONTENT.search(m.group(0)):
+            meta[m.group(1).lower()] = html.unescape(c.group(1) if c.group(1) is not None else c.group(2))
+    if not meta.get('log_resultcount', '').isdigit() or 'log_processedquery' not in meta:
+        return None
+    records = ""
+    if pre := _PMPRE.search(text):
+        # Closing tag by plain search, a lazy regex group is slow on large pages
+        if (end := text.find('</pre>', pre.end())) < 0 or '<' in (records := text[pre.end():end]):
+            return None
+        records = html.unescape(records).replace("\r\n", "\n").strip()
+    elif meta['log_resultcount'] != '0':
+        return None
+    return {
+        "resultcount": int(meta['log_resultcount']),
+        "processedquery": meta['log_processedquery'],
+        "records": records
+    }
+
+def _pmpage(client: PMClient, qs: str, page: int):
+    """Fetch one result page, return dict of result count, processed query and PubMed format records"""
+    text = client.get(f"{qs}&page={page}").text
+    t = time.perf_counter()
+    if p := _pmextract(text):
+        if _stats:
+            _stats.add("extract", time.perf_counter() - t)
+        return p
+    from bs4 import BeautifulSoup
+    s = BeautifulSoup(text, 'html.parser') # Fall back to full parse if markup changed
+    p = {
+        "resultcount": int(s.select_one("meta[name=log_resultcount]")['content']),
+        "processedquery": s.select_one("meta[name='log_processedquery']")['content'],
+        "records": _pmchunk(s)
+    }
+    if _stats:
+        _stats.add("extract (bs4)", time.perf_counter() - t)
+    return p
+
+class PMStore:
+    """SQLite store of PubMed records keyed on PMID, holding raw PubMed format text and the parsed
+    article dict. Thread safe, records being fetched by one query are waited for by others (so each
+    record is fetched once per run). Records older than `ttl` seconds or all with `refresh` are
+    considered missing. Counters in `stats`"""
+
+    def __init__(self, path: str, ttl: float = 7 * 86400, refresh: bool = False):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS records (pmid TEXT PRIMARY KEY, raw BLOB, article TEXT, stored REAL)")
+        self.ttl = ttl
+        self.since = time.time() if refresh else 0 # Records stored before this are refetched
+        self.pending = {} # pmid: threading.Event for records being fetched
+        self.stats = {"hits": 0, "misses": 0}
+        self.lock = threading.Lock()
+
+    def claim(self, pmids: list):
+        """Return PMIDs not in store that the caller should fetch (and then `put` or `release`) and
+        events to wait for (after fetching) for PMIDs being fetched by others"""
+        oldest = max(self.since, time.time() - self.ttl)
+        missing, waiting = [], []
+        with self.lock:
+            for pmid in dict.fromkeys(pmids):
+                if ev := self.pending.get(pmid):
+                    waiting.append(ev)
+                    self.stats["hits"] += 1
+                elif self.db.execute("SELECT 1 FROM records WHERE pmid = ? AND stored >= ?", (pmid, oldest)).fetchone():
+                    self.stats["hits"] += 1
+                else:
+                    self.pending[pmid] = threading.Event()
+                    missing.append(pmid)
+                    self.stats["misses"] += 1
+        return missing, waiting
+
+    def put(self, raw: str, article: dict):
+        """Store record"""
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+                (article['PMID'], zlib.compress(raw.encode("utf-8")), _dumps(article), time.time()))
+            if ev := self.pending.pop(article['PMID'], None):
+                ev.set()
+
+    def release(self, pmids: list):
+        """Stop waiting for PMIDs that were claimed but not stored (e.g. failed or nonexistent)"""
+        with self.lock:
+            for pmid in pmids:
+                if ev := self.pending.pop(pmid, None):
+                    ev.set()
+
+    def articles(self, pmids: list):
+        """Yield stored article dicts in order of PMIDs, skipping missing"""
+        for pmid in pmids:
+            with self.lock:
+                row = self.db.execute("SELECT article FROM records WHERE pmid = ?", (pmid,)).fetchone()
+            if row:
+                yield _loads(row[0])
+
+    def close(self):
+        self.db.close()
+
+class PMSync:
+    """SQLite state for incremental sync of queries: time of last run and article (with LR, date
+    last revised) per PMID for each query. Later runs only ask PubMed for records entered or revised
+    since the last run (with one day overlap), which are merged into the stored result. Records no
+    longer matching a query are not detected. Thread safe"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS queries (query TEXT PRIMARY KEY, lastrun REAL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS records (query TEXT, pmid TEXT, lr TEXT, article TEXT, PRIMARY KEY (query, pmid))")
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(q: str):
+        return " ".join(q.split())
+
+    def query(self, q: str):
+        """Return `q` restricted to records entered or revised since last run (`q` if never run)"""
+        with self.lock:
+            row = self.db.execute("SELECT lastrun FROM queries WHERE query = ?", (self.key(q),)).fetchone()
+        if not row:
+            return q
+        d = time.strftime("%Y/%m/%d", time.localtime(row[0] - 86400))
+        return f'({q}) AND ("{d}"[EDAT] : "3000"[EDAT] OR "{d}"[LR] : "3000"[LR])'
+
+    def merge(self, q: str, articles, started: float):
+        """Merge articles of a run started at `started` (time.time()) into stored result of `q`,
+        return lists of new and revised PMIDs"""
+        k, new, revised = self.key(q), [], []
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                for article in articles:
+                    pmid, lr = article['PMID'], str(article.get('LR', ""))
+                    if row := self.db.execute("SELECT lr FROM records WHERE query = ? AND pmid = ?", (k, pmid)).fetchone():
+                        if row[0] == lr:
+                            continue
+                        revised.append(pmid)
+                    else:
+                        new.append(pmid)
+                    self.db.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+                        (k, pmid, lr, _dumps(_pmdict(article))))
+                self.db.execute("INSERT OR REPLACE INTO queries VALUES (?, ?)", (k, started))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return new, revised
+
+    def articles(self, q: str, pmids: list = None):
+        """Yield stored article dicts of `q`, all (most recent PMID first) or those in `pmids`"""
+        k = self.key(q)
+        if pmids is None:
+            with self.lock:
+                pmids = [r[0] for r in self.db.execute("SELECT pmid FROM records WHERE query = ? ORDER BY CAST(pmid AS INTEGER) DESC", (k,))]
+        for pmid in pmids:
+            with self.lock:
+                row = self.db.execute("SELECT article FROM records WHERE query = ? AND pmid = ?", (k, pmid)).fetchone()
+            if row:
+                yield _loads(row[0])
+
+    def close(self):
+        self.db.close()
+
+def _pmsearch(q: str, rmax: int = -1, fmt: str = "pubmed", concurrency: int = 4, executor: "ThreadPoolExecutor" = None, client: PMClient = None, cache: PMCache = None):
+    """Run query, return processed query and list of records (PubMed format text or PMIDs depending
+    on `fmt`). Pages after the first are fetched by up to `concurrency` parallel workers (or by
+    `executor` if given). Pages are read from and stored to `cache` if given"""
+    client = client or PMClient(concurrency)
     if rmax < 0 or rmax > 100: qsize = 200
     elif rmax <= 10: qsize = 10
     elif rmax <= 20: qsize = 20
     elif rmax <= 50: qsize = 50
     elif rmax <= 100: qsize = 100
-    qs = fr'https://pubmed.ncbi.nlm.nih.gov/?term={requests.utils.quote(q)}&size={qsize}&format=pubmed' # query string
-    qn = 0 # query counter
-    matchc = -1 # number of matches
-    qc = -1 # query count to get recordc
-    matches = ""
-    rq = ""
-    while True:
-        r = requests.get(f"{qs}&page={qn + 1}")
-        if r.status_code == 200:
-            s = BeautifulSoup(r.text, 'html.parser')
-            # First lap, calculate limits
-            if qn == 0:
-                matchc = int(s.select_one("meta[name=log_resultcount]")['content'])
-                qc = math.ceil(min(rmax, matchc) / qsize)
-                rq = s.select_one("meta[name='log_processedquery']")['content']
-
-            recs = s.select_one('pre.search-results-chunk').text.replace("\r\n", "\n")
-            # Last lap
-            if qn == qc - 1:
-                ok = False
-                # Truncate if needed
-                if rmax < matchc:
-                    reca = recs.split('\n\n')
-                    if rmod := rmax % qsize:
-                        matches += "\n\n" + "\n\n".join(reca[:rmod])
-                        ok = True
-                if not ok:
-                    matches += f"\n\n{recs}"
-                break
-            else:
-                matches += f"\n\n{recs}"
-                qn += 1
+    qs = fr'{PUBMED_URL}?term={quote(q)}&size={qsize}&format={fmt}' # query string
+
+    def fetch(page):
+        """Get result page from cache or PubMed"""
+        key = PMCache.key(q, qsize, page, fmt)
+        if cache and (p := cache.get(key)):
+            return p
+        p = _pmpage(client, qs, page)
+        if cache:
+            cache.put(key, p)
+        return p
+
+    def split(records):
+        return records.split('\n\n' if fmt == "pubmed" else None) if records else []
+
+    # First page, calculate limits
+    p = fetch(1)
+    matchc = p["resultcount"] # number of matches
+    qc = math.ceil((matchc if rmax < 0 else min(rmax, matchc)) / qsize) # query count to get records
+    if qc == 0:
+        return p["processedquery"], []
+
+    # Remaining pages, all page numbers are known so fetch in parallel (map keeps order)
+    records = split(p["records"])
+    if qc > 1:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) if not executor else nullcontext(executor) as ex:
+            for pp in ex.map(fetch, range(2, qc + 1)):
+                records.extend(split(pp["records"]))
+    return p["processedquery"], records[:rmax] if rmax >= 0 else records
+
+def _pmapikey():
+    """E-utilities API key parameter from NCBI_API_KEY environment variable (allows higher rate)"""
+    return f"&api_key={key}" if (key := os.environ.get("NCBI_API_KEY")) else ""
+
+def _pmesearch(client: PMClient, q: str):
+    """Run esearch on the history server, return dict of count, query translation, WebEnv and query key"""
+    r = client.get(f"{EUTILS_URL}esearch.fcgi?db=pubmed&term={quote(q)}&usehistory=y&retmax=0&retmode=json{_pmapikey()}").json()["esearchresult"]
+    if "ERROR" in r:
+        raise RuntimeError(f"esearch: {r['ERROR']}")
+    return {"count": int(r["count"]), "querytranslation": r.get("querytranslation", q), "webenv": r["webenv"], "querykey": r["querykey"]}
+
+def _pmefetch(client: PMClient, pmids: list):
+    """Fetch PubMed format records of PMIDs with efetch, return list of records"""
+    text = client.get(f"{EUTILS_URL}efetch.fcgi?db=pubmed&id={','.join(pmids)}&rettype=medline&retmode=text{_pmapikey()}").text.strip()
+    return text.split('\n\n') if text else []
+
+def _pmeutils(q: str, rmax: int = -1, fmt: str = "pubmed", concurrency: int = 4, executor: "ThreadPoolExecutor" = None, client: PMClient = None, cache: PMCache = None, batch: int = 10000):
+    """Run query through E-utilities, esearch with history then efetch in batches of up to `batch`
+    records, return query translation and list of records (PubMed format text or PMIDs depending on
+    `fmt`). Same interface as `_pmsearch`, the esearch result and batches are read from and stored
+    to `cache` if given (so a fully cached query needs no esearch either)"""
+    client = client or PMClient(concurrency)
+    size = batch if rmax < 0 else max(1, min(batch, rmax))
+    lock, history = threading.Lock(), {}
+
+    def search():
+        """Get count and query translation from cache or esearch"""
+        key = PMCache.key(q, 0, 0, "esearch")
+        if cache and (p := cache.get(key)):
+            return p
+        history.update(_pmesearch(client, q))
+        p = {"resultcount": history["count"], "processedquery": history["querytranslation"], "records": ""}
+        if cache:
+            cache.put(key, p)
+        return p
+
+    def fetch(page):
+        """Get batch from cache or efetch, running esearch first if the history is not yet known"""
+        key = PMCache.key(q, size, page, f"eutils-{fmt}")
+        if cache and (p := cache.get(key)):
+            return p
+        with lock:
+            if not history:
+                history.update(_pmesearch(client, q))
+        text = client.get(f"{EUTILS_URL}efetch.fcgi?db=pubmed&query_key={history['querykey']}&WebEnv={history['webenv']}"
+            f"&retstart={(page - 1) * size}&retmax={size}&rettype={'medline' if fmt == 'pubmed' else 'uilist'}&retmode=text{_pmapikey()}").text
+        p = {"resultcount": history["count"], "processedquery": history["querytranslation"], "records": text.strip()}
+        if cache:
+            cache.put(key, p)
+        return p
+
+    p = search()
+    qc = math.ceil((p["resultcount"] if rmax < 0 else min(rmax, p["resultcount"])) / size) # efetch count to get records
+    records = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) if not executor else nullcontext(executor) as ex:
+        for pp in ex.map(fetch, range(1, qc + 1)):
+            if pp["records"]:
+                records.extend(pp["records"].split('\n\n' if fmt == "pubmed" else None))
+    return p["processedquery"], records[:rmax] if rmax >= 0 else records
+
+def pmquery(q: str, rmax: int = -1, concurrency: int = 4, executor: "ThreadPoolExecutor" = None, client: PMClient = None, cache: PMCache = None, store: PMStore = None, engine: str = "web"):
+    """Query PubMed, pages after the first are fetched by up to `concurrency` parallel workers
+    (or by `executor` if given, e.g. to share one pool between queries). Pages are read from and
+    stored to `cache` if given. Raise on failed request.
+    `engine` "web" scrapes the PubMed web UI 200 records per request, "eutils" uses E-utilities
+    esearch/efetch with history, up to 10000 records per request.
+    With `store` the query is only resolved to PMIDs ("pmids" key) and records not in the store are
+    fetched into it, "result" is then a generator of article dicts from the store rather than text"""
+    client = client or PMClient(concurrency)
+    search = _pmeutils if engine == "eutils" else _pmsearch
+    if not store:
+        rq, records = search(q, rmax, "pubmed", concurrency, executor, client, cache)
+        return {"user query": q, "actual query": rq, "result": "\n\n".join(records)}
+
+    rq, pmids = search(q, rmax, "pmid", concurrency, executor, client, cache)
+
+    def fill(batch):
+        """Fetch batch of PMIDs into store"""
+        try:
+            records = _pmefetch(client, batch) if engine == "eutils" else _pmsearch(" ".join(batch), len(batch), "pubmed", client=client, cache=cache)[1]
+            for raw in records:
+                for article in pmparse_iter(raw):
+                    store.put(raw, article)
+        finally:
+            store.release(batch)
+
+    missing, waiting = store.claim(pmids)
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) if not executor else nullcontext(executor) as ex:
+            list(ex.map(fill, [missing[i:i + 200] for i in range(0, len(missing), 200)]))
+    for ev in waiting:
+        ev.wait()
+    return {"user query": q, "actual query": rq, "pmids": pmids, "result": store.articles(pmids)}
+
+def pmqueries(queries, rmax: int = -1, parallel: int = 4, concurrency: int = 4, client: PMClient = None, cache: PMCache = None, store: PMStore = None, sync: PMSync = None, diff: bool = False, engine: str = "web"):
+    """Run queries `parallel` at a time, yield results in input order. Result pages of all queries
+    are fetched by one shared pool of `concurrency` workers through one client (i.e. one connection
+    pool and rate limit). A failed query is yielded with an "error" key and does not stop the others.
+    With `sync` only records new or revised since the last run are fetched and merged into the
+    stored result, "result" is then the full merged result or with `diff` only the changed records
+    (PMIDs in "new" and "revised" keys)"""
+    client = client or PMClient(concurrency + parallel)
+
+    def run(q):
+        try:
+            if sync:
+                started = time.time()
+                # Delta queries read neither cache nor store, which would serve pages and records from
+                # before the last run (the date window only changes daily)
+                fresh = (sq := sync.query(q)) != q
+                r = pmquery(sq, rmax, executor=pages, client=client, cache=None if fresh else cache, store=None if fresh else store, engine=engine)
+                result = pmparse_iter(r['result']) if type(r['result']) == str else r['result']
+                new, revised = sync.merge(q, result, started)
+                r.pop('pmids', None)
+                r.update({"user query": q, "new": new, "revised": revised, "result": sync.articles(q, new + revised if diff else None)})
+                return r
+            return pmquery(q, rmax, executor=pages, client=client, cache=cache, store=store, engine=engine)
+        except Exception as e:
+            return {"user query": q, "actual query": "", "result": "", "error": f"{type(e).__name__}: {e}"}
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pages, ThreadPoolExecutor(max_workers=max(1, parallel)) as workers:
+        pending = deque() # Bounded window of submitted queries, oldest first
+        for q in queries:
+            pending.append(workers.submit(run, q))
+            if len(pending) >= 2 * max(1, parallel):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+_PMPMID = re.compile(r'^PMID- *(\d+)', re.M)
+
+def pmmerge(results, op: str = "union", store: PMStore = None):
+    """Merge query result dicts (as from `pmqueries`, "result" PubMed format text or articles) into
+    unique articles, yield article dicts once each in order of first match, with own key "QUERIES"
+    listing the user queries that matched it. `op` selects articles matched by any query ("union"),
+    by all ("intersection") or by the first and none of the others ("difference"). Only selected
+    records are parsed, once, or read from `store` if the results carry PMIDs (see `pmquery`)"""
+    records, matched, queries = {}, {}, [] # pmid: record text, article or None (in store); pmid: query indices
+    for r in results:
+        i = len(queries)
+        queries.append(r['user query'])
+        if store and r.get('pmids') is not None:
+            items = ((pmid, None) for pmid in r['pmids'])
+        elif type(r['result']) == str:
+            items = ((m.group(1) if (m := _PMPMID.search(rec)) else None, rec) for rec in _pmrecords(r['result']))
         else:
-            break
-    return {
-        "user query": q,
-        "actual query": rq,
-        "result": matches.strip()
-    }
+            items = ((a.get('PMID'), a) for a in r['result'])
+        for pmid, rec in items:
+            if pmid is None:
+                continue
+            if (qs := matched.get(pmid)) is None:
+                matched[pmid] = [i]
+                records[pmid] = rec
+            elif qs[-1] != i:
+                qs.append(i)
+
+    for pmid, qs in matched.items():
+        if op == "intersection" and len(qs) < len(queries) or op == "difference" and qs != [0]:
+            continue
+        if (rec := records[pmid]) is None:
+            if (article := next(store.articles([pmid]), None)) is None:
+                continue
+        elif type(rec) == str:
+            article = next(pmparse_iter(rec))
+        else:
+            article = _pmdict(rec)
+        article['QUERIES'] = [queries[i] for i in qs] # Own key for matching queries
+        yield article
+
+_PMFIELD = re.compile(r'^([A-Z0-9]+) *- (.*(?:\n[ \t].*)*)', re.M) # Tag line with following continuation lines
+_PMCONT = re.compile(r' ?\n[ \t]+') # Line break to continuation line not in the usual 6 space indentation
+
+def _pmfau(authors, val):
+    authors.append({'FAU': val})
+
+def _pmau(authors, val):
+    if not authors or 'AU' in authors[-1]: # AU only records (before 2002), no FAU
+        authors.append({})
+    authors[-1]['AU'] = val
+
+def _pmauid(authors, val):
+    if not authors:
+        authors.append({})
+    authors[-1]['AUID'] = val
+
+def _pmad(authors, val):
+    if not authors:
+        authors.append({})
+    if not authors[-1].get('AD'):
+        authors[-1]['AD'] = []
+    authors[-1]['AD'].append(val)
+
+_PMAUTHOR = {'FAU': _pmfau, 'AU': _pmau, 'AUID': _pmauid, 'AD': _pmad} # Author tags, FAU (or AU without FAU) starts new author
+
+CODECS = (".gz", ".bz2", ".zst") # Compressed file extensions handled by pmopen
+
+def pmopen(path: str, mode: str = "rt", threads: int = -1):
+    """Open file (text modes UTF-8), streaming through gzip, bzip2 or zstd (requires zstandard) codec
+    by extension. zstd output is compressed by `threads` threads (-1 for one per core)"""
+    ext = os.path.splitext(path)[1]
+    kw = {} if "b" in mode else {"encoding": "utf-8"}
+    if ext == ".gz":
+        return gzip.open(path, mode, compresslevel=6, **kw) # zlib default level, 9 is much slower for little gain
+    if ext == ".bz2":
+        return bz2.open(path, mode, **kw)
+    if ext == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd files require zstandard (pip install zstandard)")
+        f = open(path, "rb" if "r" in mode else "wb")
+        if "r" in mode:
+            stream = zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=3, threads=threads).stream_writer(f, closefd=True)
+        return stream if "b" in mode else io.TextIOWrapper(stream, **kw)
+    return open(path, mode, **kw)
+
+def _pmblocks(f, blocksize: int = 1 << 20):
+    """Yield blocks of whole records (split at a blank line) read from file object"""
+    rest = ""
+    while block := f.read(blocksize):
+        block = (rest + block).replace('\r\n', '\n')
+        if (cut := block.rfind('\n\n')) < 0:
+            rest = block
+            continue
+        rest = block[cut + 2:] # Possibly incomplete, keep for next block
+        yield block[:cut]
+    yield rest
+
+def _pmrecords(src, blocksize: int = 1 << 20):
+    """Yield record texts from string, file object (read in blocks) or iterable of lines"""
+    if type(src) == str:
+        yield from src.replace('\r\n', '\n').split('\n\n')
+    elif hasattr(src, 'read'):
+        for block in _pmblocks(src, blocksize):
+            yield from block.split('\n\n')
+    else:
+        rec = []
+        for line in src:
+            if line.strip():
+                rec.append(line.rstrip('\r\n'))
+            elif rec:
+                yield "\n".join(rec)
+                rec = []
+        yield "\n".join(rec)
+
+def _pmcont(val: str):
+    """Join continuation lines of value, usually indented 6 spaces"""
+    val = val.replace(' \n      ', ' ').replace('\n      ', ' ')
+    return _PMCONT.sub(' ', val) if '\n' in val else val
+
+class PMArticle:
+    """Compact article, interned tags and their values as one UTF-8 buffer, rather than the article dict
+    of `pmparse_iter` (which `to_dict` builds on request). Values of a tag (str or list as in the dict),
+    "AUS" and "URL" are built when accessed"""
+    __slots__ = ('tags', 'data')
+
+    def __init__(self, tags: tuple, data: bytes):
+        self.tags = tags
+        self.data = data
+
+    @classmethod
+    def from_fields(cls, fields: list):
+        """Create from list of (tag, value) pairs, continuation lines already joined"""
+        return cls(tuple(sys.intern(k) for k, _ in fields), "\n".join(v for _, v in fields).encode("utf-8"))
+
+    def fields(self):
+        """(tag, value) pairs in record order"""
+        return zip(self.tags, self.data.decode("utf-8").split("\n"))
+
+    def to_dict(self):
+        """Article dict as from `pmparse_iter`"""
+        return _pmbuild(self.fields())
+
+    def get(self, key: str, default=None):
+        if key == 'AUS':
+            authors = []
+            for k, v in self.fields():
+                if f := _PMAUTHOR.get(k):
+                    f(authors, v)
+            return authors
+        if key == 'URL':
+            return f"https://pubmed.ncbi.nlm.nih.gov/{self.get('PMID')}/"
+        if key not in self.tags or key in _PMAUTHOR:
+            return default
+        vals = [v for k, v in self.fields() if k == key]
+        return vals[0] if len(vals) == 1 else vals
+
+    def __getitem__(self, key: str):
+        if (val := self.get(key)) is None:
+            raise KeyError(key)
+        return val
+
+    def __contains__(self, key: str):
+        return key in ('AUS', 'URL') or key in self.tags and key not in _PMAUTHOR
+
+    def __repr__(self):
+        return f"PMArticle(PMID {self.get('PMID')})"
+
+def _pmdict(article):
+    """Article dict of article dict or `PMArticle`"""
+    return article.to_dict() if type(article) == PMArticle else article
+
+def _pmbuild(fields):
+    """Article dict from (tag, value) pairs of one record, None if empty"""
+    author = _PMAUTHOR.get
+    article, authors = {}, []
+    for key, val in fields:
+        if '\n' in val:
+            val = _pmcont(val)
+        if f := author(key):
+            f(authors, val)
+        elif not (cur := article.get(key)):
+            article[key] = val
+        elif type(cur) != list:
+            article[key] = [cur, val]
+        else:
+            cur.append(val)
+    if article:
+        article['AUS'] = authors # Own key for array of authors
+        article['URL'] = f"https://pubmed.ncbi.nlm.nih.gov/{article['PMID']}/" # Own key for URL
+        return article
+
+def pmparse_iter(src, compact: bool = False):
+    """Parse PubMed format from string, file object or iterable of lines, yield one article dict (or
+    with `compact` one `PMArticle`) at a time"""
+    fields = _PMFIELD.findall
+    for rec in _pmrecords(src):
+        if compact:
+            if fl := [(k, _pmcont(v) if '\n' in v else v) for k, v in fields(rec)]:
+                yield PMArticle.from_fields(fl)
+        elif article := _pmbuild(fields(rec)):
+            yield article
+
+def _pmxtext(el):
+    """Text of XML element including inline markup (e.g. <i>), whitespace normalized, "" if None"""
+    return " ".join("".join(el.itertext()).split()) if el is not None else ""
+
+def _pmxdate(el, fmt: str = "{}{}{}"):
+    """Year, month and day of XML date element formatted by `fmt` (YYYYMMDD), "" if None"""
+    return fmt.format(*(_pmxtext(el.find(k)).zfill(2) for k in ("Year", "Month", "Day", "Hour", "Minute"))) if el is not None else ""
+
+def _pmxfields(art):
+    """(tag, value) pairs of PubmedArticle XML element, in PubMed format order"""
+    mc = art.find("MedlineCitation")
+    a, info, pd = mc.find("Article"), mc.find("MedlineJournalInfo"), art.find("PubmedData")
+    j = a.find("Journal")
+    t = lambda el, path: _pmxtext(el.find(path)) if el is not None else ""
+    ids = {i.get("IdType"): _pmxtext(i) for i in art.iterfind("PubmedData/ArticleIdList/ArticleId")}
+    history = {h.get("PubStatus"): _pmxdate(h, "{}/{}/{} {}:{}") for h in art.iterfind("PubmedData/History/PubMedPubDate")}
+    date = j.find("JournalIssue/PubDate")
+    dp = t(date, "MedlineDate") or " ".join(filter(None, (t(date, "Year"), t(date, "Month"), t(date, "Day"))))
+    vi, ip, pg, ta = t(j, "JournalIssue/Volume"), t(j, "JournalIssue/Issue"), t(a, "Pagination/MedlinePgn"), t(info, "MedlineTA")
+
+    f = [("PMID", t(mc, "PMID")), ("OWN", mc.get("Owner", "")), ("STAT", mc.get("Status", "")),
+        ("DCOM", _pmxdate(mc.find("DateCompleted"))), ("LR", _pmxdate(mc.find("DateRevised")))]
+    f += [("IS", f"{_pmxtext(i)} ({i.get('IssnType')})") for i in j.iterfind("ISSN")]
+    f += [("VI", vi), ("IP", ip), ("DP", dp), ("TI", t(a, "ArticleTitle") or t(a, "VernacularTitle")), ("PG", pg)]
+    f += [("LID", f"{_pmxtext(e)} [{e.get('EIdType')}]") for e in a.iterfind("ELocationID")]
+    f.append(("AB", " ".join(f"{l}: {_pmxtext(ab)}" if (l := ab.get("Label")) else _pmxtext(ab) for ab in a.iterfind("Abstract/AbstractText"))))
+    f.append(("CI", t(a, "Abstract/CopyrightInformation")))
+    for au in a.iterfind("AuthorList/Author"):
+        if cn := t(au, "CollectiveName"):
+            f.append(("CN", cn))
+            continue
+        last, fore, init = t(au, "LastName"), t(au, "ForeName"), t(au, "Initials")
+        f += [("FAU", f"{last}, {fore}" if fore else last), ("AU", f"{last} {init}" if init else last)]
+        f += [("AUID", f"{i.get('Source')}: {_pmxtext(i)}") for i in au.iterfind("Identifier")]
+        f += [("AD", _pmxtext(ad)) for ad in au.iterfind("AffiliationInfo/Affiliation")]
+    f += [("LA", _pmxtext(la)) for la in a.iterfind("Language")]
+    f += [("GR", "/".join(filter(None, (t(g, "GrantID"), t(g, "Acronym"), t(g, "Agency"), t(g, "Country"))))) for g in a.iterfind("GrantList/Grant")]
+    f += [("PT", _pmxtext(p)) for p in a.iterfind("PublicationTypeList/PublicationType")]
+    f += [("DEP", _pmxdate(d)) for d in a.iterfind("ArticleDate[@DateType='Electronic']")]
+    f += [("PL", t(info, "Country")), ("TA", ta), ("JT", t(j, "Title")), ("JID", t(info, "NlmUniqueID"))]
+    f += [("RN", f"{t(c, 'RegistryNumber')} ({t(c, 'NameOfSubstance')})") for c in mc.iterfind("ChemicalList/Chemical")]
+    f += [("SB", _pmxtext(s)) for s in mc.iterfind("CitationSubset")]
+    for mh in mc.iterfind("MeshHeadingList/MeshHeading"):
+        f.append(("MH", "/".join(("*" if n.get("MajorTopicYN") == "Y" else "") + _pmxtext(n) for n in mh if n.tag in ("DescriptorName", "QualifierName"))))
+    f.append(("PMC", ids.get("pmc", "")))
+    for kl in mc.iterfind("KeywordList"):
+        f.append(("OTO", kl.get("Owner", "")))
+        f += [("OT", _pmxtext(k)) for k in kl.iterfind("Keyword")]
+    f += [("COIS", _pmxtext(c)) for c in mc.iterfind("CoiStatement")]
+    f += [("EDAT", history.get("pubmed", "")), ("MHDA", history.get("medline", "")), ("CRDT", history.get("entrez", ""))]
+    f += [("PHST", f"{d} [{s}]") for s, d in history.items()]
+    f += [("AID", f"{v} [{k}]") for k, v in ids.items() if k not in ("pubmed", "pmc")]
+    f.append(("PST", t(pd, "PublicationStatus")))
+    # Source as in PubMed format, e.g. "Biomed Res Int. 2019 Jun 9;2019:3639693. doi: 10.1155/2019/3639693."
+    so = f"{ta}. {dp}" + (f";{vi}" if vi else "") + (f"({ip})" if ip else "") + (f":{pg}" if pg else "") + "."
+    f.append(("SO", so + (f" doi: {ids['doi']}." if ids.get("doi") else "")))
+    return [(k, v) for k, v in f if v]
+
+def pmparse_xml(src, compact: bool = False):
+    """Parse PubMed XML (e.g. baseline/update files, compressed files see `pmopen`) from file name or
+    binary file object, yield one article dict (or with `compact` one `PMArticle`) at a
+    time, as `pmparse_iter`. Streams with iterparse, clearing each record when done (so memory use does
+    not grow with the file). Book articles and deleted citations are skipped"""
+    from xml.etree import ElementTree
+    f = pmopen(src, "rb") if type(src) == str else src
+    try:
+        root = None
+        for event, el in ElementTree.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = el
+            elif event == "end" and el.tag in ("PubmedArticle", "PubmedBookArticle", "DeleteCitation"):
+                if el.tag == "PubmedArticle":
+                    # Through PubMed format, so the article is exactly as from pmparse_iter
+                    yield from pmparse_iter("\n".join(f"{k.ljust(4)}- {v}" for k, v in _pmxfields(el)), compact)
+                root.clear()
+    finally:
+        if f is not src:
+            f.close()
 
 def pmparse(input: str):
-    """Parse string in PubMed format into dict"""
-    articles = []
-    for iarticle in input.split('\n\n'):
-        iarticle = re.sub('[ ]\n[ ]+', ' ', iarticle)
-        oarticle = {}
-        authors = []
-        for key, val in re.findall(r'^([A-Z]+)\s*- (.*?)$', iarticle, flags=re.MULTILINE):
-
-            def add(dest, k, v):
-                """Add key/val pair, if key exists convert val to list"""
-                if not dest.get(k):
-                    dest[k] = v
-                elif type(dest[k]) != list:
-                    dest[k] = [dest[k], val]
-                else:
-                    dest[k].append(val)
-
-            if key == 'FAU':
-                authors.append({'FAU': val})
-            elif key == 'AU':
-                authors[-1]['AU'] = val
-            elif key == 'AUID':
-                authors[-1]['AUID'] = val
-            elif key == 'AD':
-                if not authors[-1].get('AD'):
-                    authors[-1]['AD'] = []
-                authors[-1]['AD'].append(val)
+    """Parse string in PubMed format into list of dicts"""
+    return list(pmparse_iter(input))
+
+class PMIndex:
+    """Byte offset index of the records of a PubMed format file, keyed on PMID and kept in a sidecar
+    file (`path` + ".pmidx", rebuilt when the file changes). The file is memory mapped and selected
+    records are decoded straight from the mapping"""
+    MAGIC = b"PMIX1"
+    HEADER = struct.Struct("<5sQQQ") # magic, file size, file mtime (ns), record count
+    PMIDTAG = re.compile(rb'^PMID- *(\d+)', re.M)
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ipath = path + ".pmidx"
+        st = os.stat(path)
+        self.pmids, self.offsets, self.lengths = array('I'), array('Q'), array('I')
+        if not self.load(st):
+            self.build(st)
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b""
+        self.view = memoryview(self.mm)
+
+    def load(self, st):
+        """Load sidecar index if it exists and matches the file, return success"""
+        try:
+            with open(self.ipath, "rb") as f:
+                magic, size, mtime, n = self.HEADER.unpack(f.read(self.HEADER.size))
+                if magic != self.MAGIC or size != st.st_size or mtime != st.st_mtime_ns:
+                    return False
+                for arr in (self.pmids, self.offsets, self.lengths):
+                    arr.fromfile(f, n)
+                    if sys.byteorder == "big":
+                        arr.byteswap()
+            return True
+        except (OSError, EOFError, struct.error):
+            return False
+
+    def build(self, st):
+        """Scan file for records and write sidecar index sorted on PMID"""
+        pmids, offsets, lengths = array('I'), array('Q'), array('I')
+        if st.st_size:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                sep = b"\r\n\r\n" if b"\r\n" in mm[:65536] else b"\n\n"
+                for m in self.PMIDTAG.finditer(mm):
+                    # Record runs from its PMID line (always first) to next blank line
+                    if (end := mm.find(sep, m.start())) < 0:
+                        end = st.st_size
+                    pmids.append(int(m.group(1)))
+                    offsets.append(m.start())
+                    lengths.append(end - m.start())
+        order = sorted(range(len(pmids)), key=pmids.__getitem__)
+        self.pmids = array('I', (pmids[i] for i in order))
+        self.offsets = array('Q', (offsets[i] for i in order))
+        self.lengths = array('I', (lengths[i] for i in order))
+        try:
+            with open(self.ipath, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, st.st_size, st.st_mtime_ns, len(self.pmids)))
+                for arr in (self.pmids, self.offsets, self.lengths):
+                    if sys.byteorder == "big":
+                        arr = array(arr.typecode, arr)
+                        arr.byteswap()
+                    arr.tofile(f)
+        except OSError as e:
+            print(f"Unable to write index {self.ipath}: {e}", file=sys.stderr)
+
+    def __len__(self):
+        return len(self.pmids)
+
+    def record(self, pmid):
+        """PubMed format text of record, None if not in file (or not a PMID)"""
+        if not str(pmid).isdigit():
+            return None
+        pmid = int(pmid)
+        i = bisect.bisect_left(self.pmids, pmid)
+        if i == len(self.pmids) or self.pmids[i] != pmid:
+            return None
+        return str(self.view[self.offsets[i]:self.offsets[i] + self.lengths[i]], "utf-8")
+
+    def close(self):
+        self.view.release()
+        if self.mm:
+            self.mm.close()
+        self.file.close()
+
+def pmselect(path: str, pmids):
+    """Parse only records with the given PMIDs from PubMed format file (see `PMIndex`), yield article
+    dicts in order of `pmids`, missing PMIDs are reported on stderr"""
+    index = PMIndex(path)
+    try:
+        for pmid in pmids:
+            if (rec := index.record(pmid)) is None:
+                print(f"PMID not found: {pmid}", file=sys.stderr)
             else:
-                add(oarticle, key, val)
+                yield from pmparse_iter(rec)
+    finally:
+        index.close()
+
+_PMFTSTOKEN = re.compile(r'\s*(\(|\)|"[^"]*"\*?|\[[^\]]*\]|[^\s()\[\]"]+)') # Query token: parenthesis, phrase, field tag or word
+PMFTSFIELDS = {"ti": "ti", "ab": "ab", "tiab": "{ti ab}", "mh": "mh", "mesh": "mh", "au": "au", "author": "au",
+    "pmid": "pmid", "uid": "pmid", "all": "", "tw": ""} # PubMed field tag: FTS5 column filter
+
+def _pmftsterm(word: str):
+    """Word or phrase as quoted FTS5 string, trailing * for prefix search"""
+    prefix = "*" if word.endswith("*") else ""
+    word = word.rstrip("*").strip('"')
+    return f'"{word}"{prefix}' if word else ""
+
+def pmftsquery(q: str):
+    """Translate PubMed style query, with [ti]/[ab]/[tiab]/[mh]/[au]/[pmid] field tags, AND/OR/NOT,
+    parentheses, quoted phrases and trailing * wildcards, to FTS5 query. A tag applies to the words
+    since the last operator or parenthesis (as a phrase for [au], e.g. "Polat B[au]"), or to the
+    parenthesized group it follows"""
+    out, words, opened, closed = [], [], [], None
+
+    def flush(col=None):
+        if not words:
+            return
+        if col == "au":
+            out.append(f'au : {_pmftsterm(" ".join(w.strip(chr(34)) for w in words))}')
+        else:
+            terms = " ".join(_pmftsterm(w) for w in words)
+            out.append(f"{col} : ({terms})" if col and len(words) > 1 else f"{col} : {terms}" if col else terms)
+        words.clear()
+
+    for tok in _PMFTSTOKEN.findall(q):
+        if tok.startswith("["):
+            if (col := PMFTSFIELDS.get(tok[1:-1].strip().lower())) is None:
+                raise ValueError(f"Unsupported field tag {tok}")
+            if not words and closed is not None and out and out[-1] == ")":
+                if col:
+                    out[closed:] = [f"{col} : {' '.join(out[closed:])}"]
+            else:
+                flush(col)
+        elif tok in ("AND", "OR", "NOT", "(", ")"):
+            flush()
+            if tok == "(":
+                opened.append(len(out))
+            elif tok == ")":
+                closed = opened.pop() if opened else None
+            out.append(tok)
+        else:
+            words.append(tok)
+    flush()
+    return " ".join(out)
+
+class PMSearch:
+    """Full text index of articles in SQLite FTS5 (title, abstract, MeSH terms, authors and PMID),
+    searched with PubMed style fielded queries (see `pmftsquery`) and ranked by BM25. Articles are
+    stored too, so results are output without the source files"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, isolation_level=None)
+        # Rollback journal rather than WAL, which writes bulk additions twice (log and checkpoint)
+        self.db.execute("CREATE TABLE IF NOT EXISTS articles (pmid INTEGER PRIMARY KEY, article BLOB)")
+        self.db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(ti, ab, mh, au, pmid, tokenize='unicode61 remove_diacritics 2')")
+
+    def add(self, articles, batch: int = 10000):
+        """Add articles (replacing those with the same PMID) in transactions of `batch`, return count"""
+        def text(val):
+            return "; ".join(val) if type(val) == list else val or ""
+
+        n, rows = 0, []
+        for article in map(_pmdict, articles):
+            if not str(pmid := article.get('PMID', "")).isdigit():
+                continue
+            rows.append((int(pmid), text(article.get('TI')), text(article.get('AB')), text(article.get('MH')),
+                "; ".join(f"{au.get('FAU', '')}; {au.get('AU', '')}" for au in article['AUS']), pmid, zlib.compress(_dumps(article).encode("utf-8"))))
+            if len(rows) >= batch:
+                n += self._write(rows)
+        return n + self._write(rows)
+
+    def _write(self, rows: list):
+        """Write batch of rows in one transaction, the last of rows with the same PMID (e.g. in update
+        files) replacing the others, clear it and return number of records written"""
+        unique = list({r[0]: r for r in rows}.values())
+        rows.clear()
+        self.db.execute("BEGIN")
+        try:
+            self.db.executemany("DELETE FROM fts WHERE rowid = ?", [r[:1] for r in unique])
+            self.db.executemany("INSERT INTO fts (rowid, ti, ab, mh, au, pmid) VALUES (?, ?, ?, ?, ?, ?)", [r[:6] for r in unique])
+            self.db.executemany("INSERT OR REPLACE INTO articles VALUES (?, ?)", [(r[0], r[6]) for r in unique])
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return len(unique)
 
-        oarticle['AUS'] = authors # Own key for array of authors
-        oarticle['URL'] = f"https://pubmed.ncbi.nlm.nih.gov/{oarticle['PMID']}/" # Own key for URL
-        articles.append(oarticle)
-    
-    return articles
+    def optimize(self):
+        """Merge index segments (after large additions) for faster search"""
+        self.db.execute("INSERT INTO fts (fts) VALUES ('optimize')")
 
-def pmformat(article: dict, fmt: str = "md"):
-    """Format article dict to string"""
+    def search(self, q: str, rmax: int = -1):
+        """Query result dict as from `pmquery`, "actual query" the FTS5 query and "result" a generator
+        of matching article dicts, best match first. Raise ValueError on invalid query"""
+        expr = pmftsquery(q)
+        try:
+            cur = self.db.execute("SELECT a.article FROM fts JOIN articles a ON a.pmid = fts.rowid WHERE fts MATCH ? ORDER BY fts.rank LIMIT ?", (expr, rmax))
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid query {expr}: {e}")
+        return {"user query": q, "actual query": expr, "result": (_loads(zlib.decompress(row[0])) for row in cur)}
+
+    def close(self):
+        self.db.close()
+
+TEMPLATES = { # Output templates by format, str.format fields title, pubtype, abstract, date, source, authors, pmid, url and fulltext
+    "md": (
+        "## {title}\n\n"
+        "Publication type: {pubtype}\n"
+        "{abstract}\n"
+        "### Information\n\n"
+        "Date of publication: {date}  \n"
+        "Source: {source}  \n"
+        "Authors: {authors}  \n"
+        "PMID: {pmid}  \n"
+        "[PubMed entry]({url})  \n"
+        "{fulltext}"
+    )
+}
+LINKS = { # Full text URLs of LID by type
+    "[doi]": "https://doi.org/{}",
+    "[pii]": "https://linkinghub.elsevier.com/retrieve/pii/{}"
+}
+_PMHEADING = re.compile(r' ([A-Z0-9 ]+:) ') # Structured abstract heading, e.g. "METHODS:", abstract prefixed with space
+_pmformatted = OrderedDict() # Memoized output by (format, PMID, LR)
+_PMFORMATTED_MAX = 10000
+
+def _pmheading(m):
+    return f"\n\n**{m.group(1).capitalize()}** "
+
+def pmformat(article: dict, fmt: str = "md", memo: bool = True):
+    """Format article dict to string with template `TEMPLATES[fmt]`, memoized on PMID and last revision
+    date unless `memo` is false (articles not from PubMed, which may differ for the same key)"""
+    key = (fmt, article.get('PMID'), str(article.get('LR')))
+    if memo and (txt := _pmformatted.get(key)) is not None:
+        _pmformatted.move_to_end(key)
+        return txt
 
     def stringify(val, sep = ", "):
         if type(val) == list:
@@ -95,11 +1133,7 @@ def pmformat(article: dict, fmt: str = "md"):
         return val
 
     if a := article.get('AB'):
-        abstract = "\n" + re.sub(
-            r'(?:^| )([A-Z0-9 ]+:) ',
-            lambda m: f"\n\n**{m.group(1).capitalize()}** ",
-            a
-        ).strip() + "\n"
+        abstract = "\n" + _PMHEADING.sub(_pmheading, f" {a}").strip() + "\n"
     else:
         abstract = ""
     txts = []
@@ -110,88 +1144,526 @@ def pmformat(article: dict, fmt: str = "md"):
             lids = [lids]
         for lid in lids:
             parts = lid.rsplit(' ', 1)
-            if len(parts) == 1:
-                continue
-            elif parts[1] == '[doi]':
-                txts.append(f"https://doi.org/{parts[0]}")
-            elif parts[1] == '[pii]':
-                txts.append(f"https://linkinghub.elsevier.com/retrieve/pii/{parts[0]}")
+            if len(parts) == 2 and (link := LINKS.get(parts[1])):
+                txts.append(link.format(parts[0]))
+
+    txt = TEMPLATES[fmt].format(
+        title=article['TI'],
+        pubtype=stringify(article['PT']),
+        abstract=abstract,
+        date=stringify(article['DP']),
+        source=stringify(article['SO'], ' | '),
+        authors=', '.join([a for au in article['AUS'] if (a := au.get('AU') or au.get('FAU'))]),
+        pmid=article['PMID'],
+        url=article['URL'],
+        fulltext="  \n".join([f"[Full text]({_url})" for _url in txts])
+    )
+    if not memo:
+        return txt
+    _pmformatted[key] = txt
+    if len(_pmformatted) > _PMFORMATTED_MAX:
+        _pmformatted.popitem(last=False)
+    return txt
+
+def _pmrender(article: dict, fmt: str = "md", memo: bool = True):
+    """Render article dict (or `PMArticle`) for output, markdown with trailing separator or JSON"""
+    if _stats:
+        _stats.enter("render")
+    article = _pmdict(article)
+    if fmt != 'md':
+        txt = _dumps(article)
+    elif qs := article.get('QUERIES'):
+        txt = f"{pmformat(article, 'md', memo).rstrip()}  \nQueries: {'; '.join(qs)}\n\n"
+    else:
+        txt = f"{pmformat(article, 'md', memo)}\n\n"
+    if _stats:
+        _stats.exit(1)
+    return txt
+
+def _pmconvert(block: str, fmt: str = "md", backend: str = "auto"):
+    """Parse and render block of records (process pool worker)"""
+    if backend != _jsonbackend:
+        pmjson(backend)
+    return [_pmrender(article, fmt) for article in pmparse_iter(block)]
+
+def pmconvert_iter(f, fmt: str = "md", jobs: int = 4, blocksize: int = 1 << 20):
+    """Parse and render PubMed format from file object on `jobs` processes, yield rendered articles
+    (see `pmwrite`) in input order. Input is split in blocks at record boundaries"""
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque() # Bounded window of submitted blocks, oldest first
+        for block in _pmblocks(f, blocksize):
+            pending.append(executor.submit(_pmconvert, block, fmt, _jsonbackend))
+            if len(pending) >= 2 * jobs:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+COLUMNS = {"PMID": False, "TI": False, "AB": False, "DP": False, "JT": False, "TA": False, "SO": False,
+    "LA": True, "PT": True, "MH": True, "OT": True, "LID": True} # Columns of columnar output, True for list columns
+
+def _pmarticles(items):
+    """Yield (user query or None, article) from article or query result dicts"""
+    for item in items:
+        if 'user query' in item:
+            for article in item['result']:
+                yield item['user query'], article
+        else:
+            yield "; ".join(item['QUERIES']) if 'QUERIES' in item else None, item
+
+def pmwrite_columnar(path: str, items, fmt: str = "parquet", batchsize: int = 10000):
+    """Write article or query result dicts as columnar Parquet or Arrow IPC file (`fmt` parquet/arrow)
+    in batches of `batchsize` records, `COLUMNS` to `path` and authors to `path` with ".authors"
+    inserted before the extension (PMID, position, FAU, AU, AUID, AD). Requires pyarrow"""
+    try:
+        import pyarrow as pa
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(f"{fmt} output requires pyarrow (pip install pyarrow)")
+
+    str_list = pa.list_(pa.string())
+    aschema = pa.schema([("query", pa.string())] + [(k, str_list if lst else pa.string()) for k, lst in COLUMNS.items()])
+    uschema = pa.schema([("PMID", pa.string()), ("position", pa.int32()), ("FAU", pa.string()), ("AU", pa.string()),
+        ("AUID", pa.string()), ("AD", str_list)])
+    root, ext = os.path.splitext(path)
+
+    def writer(p, schema):
+        return pq.ParquetWriter(p, schema) if fmt == 'parquet' else pa.ipc.new_file(p, schema)
+
+    def flush(w, schema, cols):
+        if cols[schema.names[0]]:
+            w.write_table(pa.Table.from_pydict(cols, schema=schema))
+        for v in cols.values():
+            v.clear()
+
+    aw, uw = writer(path, aschema), writer(f"{root}.authors{ext}", uschema)
+    acols = {k: [] for k in aschema.names}
+    ucols = {k: [] for k in uschema.names}
+    try:
+        for q, article in _pmarticles(items):
+            article = _pmdict(article)
+            acols["query"].append(q)
+            for k, lst in COLUMNS.items():
+                v = article.get(k)
+                if lst:
+                    acols[k].append([v] if type(v) == str else v or [])
+                else:
+                    acols[k].append("; ".join(v) if type(v) == list else v)
+            for i, au in enumerate(article['AUS']):
+                ucols["PMID"].append(article['PMID'])
+                ucols["position"].append(i)
+                for k in ("FAU", "AU", "AUID", "AD"):
+                    ucols[k].append(au.get(k))
+            if len(acols["query"]) >= batchsize:
+                flush(aw, aschema, acols)
+                flush(uw, uschema, ucols)
+        flush(aw, aschema, acols)
+        flush(uw, uschema, ucols)
+    finally:
+        aw.close()
+        uw.close()
+
+def _mdchunks(items, memo: bool = True):
+    """Yield markdown chunks for article or query result dicts, each ending with separator"""
+    for item in items:
+        if type(item) == str:
+            yield item
+        elif 'user query' in item:
+            yield f"# {item['user query']}\n\nActual query: {item['actual query']}\n\n"
+            if 'new' in item:
+                yield f"New: {len(item['new'])}, revised: {len(item['revised'])}\n\n"
+            if item.get('error'):
+                yield f"Error: {item['error']}\n\n"
+            yield from _mdchunks(item['result'], memo)
+        else:
+            yield _pmrender(item, 'md', memo)
+
+def _jsonitem(item):
+    """Yield JSON chunks for one article or query result dict, streaming the results of a query"""
+    if type(item) == str:
+        yield item
+    elif 'user query' in item:
+        head = {k: v for k, v in item.items() if k != 'result'}
+        sep, colon = _jsonseps
+        yield f'{_dumps(head)[:-1]}{sep}"result"{colon}['
+        for i, article in enumerate(item['result']):
+            yield f"{sep if i else ''}{_pmrender(article, 'json')}"
+        yield "]}"
+    else:
+        yield _pmrender(item, 'json')
 
-    txt =  "  \n".join([f"[Full text]({_url})" for _url in txts])
-    return f"""## {article['TI']}
+def pmwrite(of, items, fmt: str = "md", memo: bool = True):
+    """Write article or query result dicts, or articles already rendered to `fmt` by `_pmrender`,
+    to file object as they are produced. `memo` as for `pmformat`"""
+    if fmt == 'json':
+        of.write("[")
+        for i, item in enumerate(items):
+            if i:
+                of.write(_jsonseps[0])
+            for chunk in _jsonitem(item):
+                of.write(chunk)
+        of.write("]")
+    elif fmt == 'jsonl':
+        for item in items:
+            for chunk in _jsonitem(item):
+                of.write(chunk)
+            of.write("\n")
+    else:
+        # Hold back one chunk so the trailing separator of the last can be stripped
+        pending = ""
+        for chunk in _mdchunks(items, memo):
+            of.write(pending)
+            pending = chunk
+        of.write(pending.rstrip())
+
+def pmserve(address: str, client: PMClient = None, cache: PMCache = None, store: PMStore = None, engine: str = "web", parallel: int = 4, concurrency: int = 4):
+    """Serve until interrupted over HTTP on "host:port" or Unix socket path `address` (if it contains
+    a "/"), keeping client (connection pool), cache, store and memoized output warm between requests.
+    POST endpoints, output format by "format" parameter (json default, jsonl or md):
+    /query JSON {"queries": [...], "number": N} (or "query"), queries run in parallel as `pmqueries`
+    /parse PubMed format text
+    /format JSON article dict or list of them
+    GET /stats returns HTTP, cache and store counters"""
+    import socketserver, urllib.parse
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    client = client or PMClient(concurrency + parallel)
+    lock = threading.Lock() # Rendering (memoized output) is not thread safe
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep-alive
+        disable_nagle_algorithm = "/" not in address # TCP only, headers and body are separate writes
+
+        def address_string(self):
+            return self.client_address[0] if self.client_address else address
+
+        def reply(self, status: int, text: str, ctype: str = "text/plain"):
+            data = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", f"{ctype}; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if urllib.parse.urlsplit(self.path).path != "/stats":
+                return self.reply(404, "Not found\n")
+            stats = {"http": client.stats, "cache": cache.stats if cache else None, "store": store.stats if store else None}
+            self.reply(200, _dumps(stats), "application/json")
 
-Publication type: {stringify(article['PT'])}
-{abstract}
-### Information
+        def do_POST(self):
+            url = urllib.parse.urlsplit(self.path)
+            fmt = dict(urllib.parse.parse_qsl(url.query)).get("format", "json")
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            if fmt not in ("json", "jsonl", "md"):
+                return self.reply(400, f"Unknown format: {fmt}\n")
+            try:
+                if url.path == "/query":
+                    req = _loads(body)
+                    # Fetch before rendering so requests waiting for PubMed do not hold the lock
+                    items = list(pmqueries(req.get("queries") or [req["query"]], int(req.get("number", -1)), parallel, concurrency, client, cache, store, engine=engine))
+                    for r in items:
+                        r.pop('pmids', None)
+                        if type(r['result']) == str:
+                            r['result'] = pmparse_iter(r['result'])
+                elif url.path == "/parse":
+                    items = pmparse_iter(body)
+                elif url.path == "/format":
+                    items = a if type(a := _loads(body)) == list else [a]
+                else:
+                    return self.reply(404, "Not found\n")
+                out = io.StringIO()
+                with lock:
+                    pmwrite(out, items, fmt, memo=url.path == "/query") # Posted records may differ for the same PMID and LR
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                return self.reply(400, f"{type(e).__name__}: {e}\n")
+            self.reply(200, out.getvalue(), "text/markdown" if fmt == "md" else "application/json")
+
+    if "/" in address:
+        if os.path.exists(address):
+            os.unlink(address) # Stale socket of earlier run
+        server = type("Server", (socketserver.ThreadingMixIn, socketserver.UnixStreamServer), {"daemon_threads": True})(address, Handler)
+    else:
+        host, _, port = address.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), Handler)
+    print(f"Serving on {address}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if "/" in address:
+            os.unlink(address)
 
-Date of publication: {stringify(article['DP'])}  
-Source: {stringify(article['SO'], ' | ')}  
-Authors: {', '.join([au['AU'] for au in article['AUS']])}  
-PMID: {article['PMID']}  
-[PubMed entry]({article['URL']})  
-{txt}"""
+def _pmnetargs(argparser):
+    """Add query options to argument parser"""
+    argparser.add_argument("-e", "--engine", type=str, choices=["web", "eutils"], help="query PubMed through the web UI (default) or the E-utilities API", default="web")
+    argparser.add_argument("-c", "--concurrency", type=int, help="max number of result pages fetched in parallel", default=4)
+    argparser.add_argument("-p", "--parallel", type=int, help="max number of queries run in parallel", default=4)
+    argparser.add_argument("-r", "--rate", type=float, help="max number of requests per second, 0 for no limit", default=3)
+    argparser.add_argument("-t", "--timeout", type=float, help="HTTP timeout in seconds", default=30)
+    argparser.add_argument("--retries", type=int, help="max number of retries of failed HTTP requests", default=5)
+    argparser.add_argument("--cache", type=str, help="query cache file", default=os.path.join(CACHE_DIR, "cache.sqlite"))
+    argparser.add_argument("--cache-ttl", type=float, help="time to live of cached query results in hours", default=24)
+    argparser.add_argument("--cache-size", type=float, help="max size of query cache in MB", default=256)
+    argparser.add_argument("--no-cache", action="store_true", help="do not read or write query cache")
+    argparser.add_argument("--refresh", action="store_true", help="ignore cached query results (but update cache)")
+    argparser.add_argument("--store", type=str, nargs="?", const=os.path.join(CACHE_DIR, "records.sqlite"), help="keep PubMed records in (and only fetch records missing from) PMID keyed record store file (default ~/.cache/pmtool/records.sqlite)")
+    argparser.add_argument("--store-ttl", type=float, help="refetch stored records older than this many days", default=7)
+
+def _pmnet(args):
+    """Client, cache and store from parsed query options"""
+    client = PMClient(args.concurrency + args.parallel, args.rate, args.timeout, args.retries)
+    cache = None if args.no_cache else PMCache(args.cache, args.cache_ttl * 3600, int(args.cache_size * 1024 * 1024), args.refresh)
+    store = PMStore(args.store, args.store_ttl * 86400, args.refresh) if args.store else None
+    return client, cache, store
+
+def _pmservemain(argv):
+    """pmtool serve: run `pmserve` with query options"""
+    argparser = argparse.ArgumentParser(prog="pmtool serve")
+    argparser.add_argument("address", type=str, nargs="?", help="host:port or Unix socket path (default 127.0.0.1:8080)", default="127.0.0.1:8080")
+    argparser.add_argument("--json-backend", type=str, choices=["auto", "orjson", "json"], help="JSON encoder, orjson (default if installed) or json (standard library)", default="auto")
+    _pmnetargs(argparser)
+    args = argparser.parse_args(argv)
+    try:
+        pmjson(args.json_backend)
+    except ImportError as e:
+        sys.exit(str(e))
+    client, cache, store = _pmnet(args)
+    import signal
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0)) # Clean shutdown (socket removed) when stopped as a service
+    pmserve(args.address, client, cache, store, args.engine, args.parallel, args.concurrency)
+    if cache:
+        cache.close()
+    if store:
+        store.close()
+
+def _pmindexmain(argv):
+    """pmtool index: add records to or search a `PMSearch` full text index"""
+    argparser = argparse.ArgumentParser(prog="pmtool index")
+    sub = argparser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="add records (replacing those with the same PMID) of PubMed format or XML files to index")
+    add.add_argument("index", type=str, help="index file")
+    add.add_argument("files", type=str, nargs="*", help="input files, may be compressed (default stdin)")
+    add.add_argument("-x", "--xml", action="store_true", help="input is PubMed XML (default if file name ends with .xml or .xml.gz)")
+    search = sub.add_parser("search", help="search index with PubMed style query, e.g. knee[ti] AND (mri OR imaging)[tiab] AND Polat B[au]")
+    search.add_argument("index", type=str, help="index file")
+    search.add_argument("query", type=str, nargs="+", help="query, field tags [ti] [ab] [tiab] [mh] [au] [pmid], AND/OR/NOT, parentheses, \"phrases\" and prefix*")
+    search.add_argument("-n", "--number", type=int, help="max number of results, best matches first", default=-1)
+    search.add_argument("-f", "--format", type=str, choices=["md", "json", "jsonl"], help="output format", default="md")
+    search.add_argument("-o", "--output-file", type=str, help="write output to file (rather than stdout)")
+    search.add_argument("--json-backend", type=str, choices=["auto", "orjson", "json"], help="JSON encoder, orjson (default if installed) or json (standard library)", default="auto")
+    args = argparser.parse_args(argv)
+    if args.command == "search" and not os.path.exists(args.index):
+        sys.exit(f"No index {args.index}")
+    try:
+        pmjson(getattr(args, "json_backend", "auto"))
+    except ImportError as e:
+        sys.exit(str(e))
+    index = PMSearch(args.index)
+    try:
+        if args.command == "add":
+            n = 0
+            for path in args.files or ["-"]:
+                inf = pmopen(path) if path != "-" else sys.stdin
+                xml = args.xml or (path.endswith(CODECS) and os.path.splitext(path)[0] or path).endswith(".xml")
+                n += index.add(pmparse_xml(inf) if xml else pmparse_iter(inf))
+                if inf is not sys.stdin:
+                    inf.close()
+            index.optimize()
+            print(f"Indexed {n} records", file=sys.stderr)
+        else:
+            try:
+                result = index.search(" ".join(args.query), args.number)
+            except ValueError as e:
+                sys.exit(str(e))
+            of = pmopen(args.output_file, "wt") if args.output_file else sys.stdout
+            pmwrite(of, [result], args.format)
+            if of is sys.stdout:
+                if args.format != 'jsonl':
+                    of.write("\n")
+            else:
+                of.close()
+    except ImportError as e:
+        sys.exit(str(e))
+    finally:
+        index.close()
 
 def main(argv):
-    argparser = argparse.ArgumentParser()
+    if argv[:1] == ["serve"]:
+        return _pmservemain(argv[1:])
+    if argv[:1] == ["index"]:
+        return _pmindexmain(argv[1:])
+    argparser = argparse.ArgumentParser(epilog="Run as a service with warm connections and caches: pmtool serve [address] [query options]. Build and search a local full text index: pmtool index add|search")
     argparser.add_argument("-i", "--input-file", type=str, help="read input from file (rather than stdin)")
     argparser.add_argument("-o", "--output-file", type=str, help="write output to file (rather than stdout)")
-    argparser.add_argument("-f", "--format", type=str, help="output format (md/json)")
+    argparser.add_argument("-f", "--format", type=str, help="output format (md/json/jsonl/parquet/arrow)")
+    argparser.add_argument("--json-backend", type=str, choices=["auto", "orjson", "json"], help="JSON encoder, orjson (default if installed) or json (standard library)", default="auto")
     argparser.add_argument("-n", "--number", type=int, help="max number of entries (mainly for use with queries)", default=-1)
+    argparser.add_argument("-j", "--jobs", type=int, help="number of processes parsing and formatting input (not for queries)", default=1)
+    argparser.add_argument("-x", "--xml", action="store_true", help="input is PubMed XML, e.g. baseline files (default if input file name ends with .xml or .xml.gz)")
+    argparser.add_argument("--pmid", type=str, action="append", help="only parse records with these PMIDs (comma separated, repeatable) from input file, using a sidecar byte offset index")
+    argparser.add_argument("--pmid-file", type=str, help="only parse records with the PMIDs listed in this file from input file")
+    _pmnetargs(argparser)
+    argparser.add_argument("--since-last-run", action="store_true", help="only fetch records entered or revised since the last run of each query and merge them into its stored result")
+    argparser.add_argument("--sync-file", type=str, help="incremental sync state file", default=os.path.join(CACHE_DIR, "sync.sqlite"))
+    argparser.add_argument("--sync-output", type=str, choices=["full", "diff"], help="with --since-last-run output the full merged result (default) or only new and revised records", default="full")
+    argparser.add_argument("--merge", type=str, nargs="?", const="union", choices=["union", "intersection", "difference"], help="output the articles matched by any (default), all, or the first and none of the other queries once each, with the matching queries, rather than each query result")
+    argparser.add_argument("--stats", type=str, nargs="?", const="table", choices=["table", "json"], help="print time and items per stage, counters and peak RSS on stderr as table (default) or JSON")
+    argparser.add_argument("--profile", type=str, help="profile run with cProfile and write stats to this file (for pstats/snakeviz)")
     argparser.add_argument("-q", "--query", nargs=argparse.REMAINDER, help="interpret input as queries to run against PubMed")
     args = argparser.parse_args()
 
-    input = ""
-    if args.input_file:
-        with open(args.input_file, encoding="utf-8") as f:
-            for line in f:
-                input += line
+    if args.profile:
+        import cProfile
+        prof = cProfile.Profile()
+        try:
+            prof.runcall(_pmrun, args)
+        finally:
+            prof.dump_stats(args.profile)
     else:
-        for line in sys.stdin:
-            input += line
+        _pmrun(args)
+
+def _pmrun(args):
+    """Run with parsed command line arguments"""
+    global _stats
+    _stats = PMStats() if args.stats else None
+    try:
+        pmjson(args.json_backend)
+    except ImportError as e:
+        sys.exit(str(e))
+
+    def plain(path):
+        """File name without compression extension"""
+        return os.path.splitext(path)[0] if path.endswith(CODECS) else path
+
+    try:
+        inf = pmopen(args.input_file) if args.input_file else sys.stdin
+    except ImportError as e:
+        sys.exit(str(e))
 
     format = "md"
     if args.format:
         format = args.format
     elif args.output_file:
-        if ext := os.path.splitext(args.output_file)[1]:
+        if ext := os.path.splitext(plain(args.output_file))[1]:
             ext = ext[1:]
-            if ext in ['md', 'json']:
+            if ext in ['md', 'json', 'jsonl', 'parquet', 'arrow']:
                 format = ext
+    if format in ['parquet', 'arrow'] and not args.output_file:
+        sys.exit(f"{format} output requires an output file (-o)")
+    if format in ['parquet', 'arrow'] and args.output_file.endswith(CODECS):
+        sys.exit(f"{format} output is compressed internally, not by file extension")
 
+    failed = []
     if args.query != None:
-        results = []
-        for q in input.split('\n'):
-            q = q.strip()
-            if not len(q) or q[0] == '#':
-                continue
-            r = pmquery(q, args.number)
-            r['result'] = pmparse(r["result"])
-            results.append(r)
-        
-        if format == 'json':
-            out = json.dumps(results)
-        else:
-            out = ""
-            for r in results:
-                out += f"# {r['user query']}\n\nActual query: {r['actual query']}\n\n"
-                for rr in r['result']:
-                    out += f"{pmformat(rr, 'md')}\n\n"
-            out = out.strip()
+        def queries():
+            if args.query:
+                yield " ".join(args.query)
+                return
+            for q in inf:
+                q = q.strip()
+                if not len(q) or q[0] == '#':
+                    continue
+                yield q
+
+        def results():
+            rs = pmqueries(queries(), args.number, args.parallel, args.concurrency, client, cache, store, sync, args.sync_output == "diff", args.engine)
+            for r in _stats.iter(rs, "query") if _stats else rs:
+                if r.get('error'):
+                    print(f"Query failed: {r['user query']}: {r['error']}", file=sys.stderr)
+                    failed.append(r['user query'])
+                if args.merge:
+                    yield r
+                    continue
+                r.pop('pmids', None)
+                if type(r['result']) == str:
+                    r['result'] = pmparse_iter(r['result'])
+                if _stats:
+                    r['result'] = _stats.iter(r['result'], "parse")
+                yield r
+        client, cache, store = _pmnet(args)
+        sync = PMSync(args.sync_file) if args.since_last_run else None
+        items = results()
+        if args.merge:
+            items = pmmerge(items, args.merge, store)
+            if _stats:
+                items = _stats.iter(items, "merge+parse")
+    elif args.pmid or args.pmid_file:
+        if not args.input_file:
+            sys.exit("--pmid/--pmid-file require an input file (-i)")
+        if args.input_file.endswith(CODECS):
+            sys.exit("--pmid/--pmid-file require an uncompressed input file")
+        if args.xml or plain(args.input_file).endswith(".xml"):
+            sys.exit("--pmid/--pmid-file require PubMed format input, not XML")
+        pmids = [p for arg in args.pmid or [] for p in re.split(r'[\s,]+', arg) if p]
+        if args.pmid_file:
+            with open(args.pmid_file, encoding="utf-8") as f:
+                pmids.extend(p for p in re.split(r'[\s,]+', f.read()) if p)
+        if invalid := [p for p in pmids if not p.isdigit()]:
+            sys.exit(f"Invalid PMIDs: {', '.join(invalid[:10])}{' ...' if len(invalid) > 10 else ''}")
+        items = pmselect(args.input_file, pmids)
+    elif args.xml or plain(args.input_file or "").endswith(".xml"):
+        items = pmparse_xml(args.input_file or sys.stdin.buffer)
+    elif args.jobs > 1 and format in ['md', 'json', 'jsonl']:
+        items = pmconvert_iter(inf, format, args.jobs)
     else:
-        if format == 'json':
-            out = json.dumps(pmparse(input))
-        else:
-            out = ""
-            for r in pmparse(input):
-                out += f"{pmformat(r, 'md')}\n\n"
-            out = out.strip()
-
-    if args.output_file:
-        of = open(args.output_file, "w", encoding="utf-8")        
-        of.write(out)
-        of.close()
+        items = pmparse_iter(inf)
+    if _stats and args.query == None:
+        items = _stats.iter(items, "parse+render" if args.jobs > 1 and format in ['md', 'json', 'jsonl'] else "parse")
+
+    if format in ['parquet', 'arrow']:
+        try:
+            if _stats:
+                _stats.enter("write")
+            pmwrite_columnar(args.output_file, items, format)
+            if _stats:
+                _stats.exit()
+        except ImportError as e:
+            sys.exit(str(e))
     else:
-        print(out)
+        try:
+            of = pmopen(args.output_file, "wt") if args.output_file else sys.stdout
+        except ImportError as e:
+            sys.exit(str(e))
+        if _stats:
+            _stats.enter("write")
+        pmwrite(of, items, format)
+        if of is sys.stdout:
+            if format != 'jsonl':
+                of.write("\n")
+        else:
+            of.close()
+        if _stats:
+            _stats.exit()
+    if inf is not sys.stdin:
+        inf.close()
+    if _stats:
+        counters = {}
+        if args.query != None:
+            counters.update({f"http {k}": round(v, 3) for k, v in client.stats.items()})
+            if cache:
+                counters.update({f"cache {k}": v for k, v in cache.stats.items()})
+            if store:
+                counters.update({f"store {k}": v for k, v in store.stats.items()})
+        report = _stats.report(**counters)
+        print(_dumps(report) if args.stats == "json" else PMStats.table(report), file=sys.stderr)
+    if args.query != None and cache:
+        cache.close()
+    if args.query != None and store:
+        st = store.stats
+        print(f"Record store: {st['hits']} hits, {st['misses']} misses "
+            f"({st['hits'] / max(1, st['hits'] + st['misses']):.0%} hit ratio)", file=sys.stderr)
+        store.close()
+    if args.query != None and sync:
+        sync.close()
+    if args.query != None and (client.stats['retries'] or client.stats['errors']):
+        st = client.stats
+        print(f"HTTP: {st['requests']} requests, {st['retries']} retries, {st['errors']} errors, "
+            f"{st['bytes']} bytes, {st['latency'] / max(1, st['requests']):.3f} s average latency", file=sys.stderr)
+    if failed:
+        sys.exit(f"{len(failed)} queries failed")
 
 if __name__ == "__main__":
     main(sys.argv[1:])
@@ -0,0 +1,23 @@
+"""Tests import pmtool from src/py and the PubMed stand-in (server.py) and corpus generator from bench"""
+import os, sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src", "py"), os.path.join(ROOT, "bench")]
+import pmtool
+from corpus import generate
+from server import PMServer
+
+
+@pytest.fixture(scope="session")
+def records():
+    """Synthetic corpus shared by the tests, 450 records (three result pages of 200) with PMIDs from 30000000"""
+    return list(generate(450))
+
+@pytest.fixture
+def server(records, monkeypatch):
+    """PubMed stand-in serving `records`, pmtool pointed at it for the test"""
+    with PMServer(records) as s:
+        monkeypatch.setattr(pmtool, "PUBMED_URL", s.url)
+        monkeypatch.setattr(pmtool, "EUTILS_URL", s.url)
+        yield s
@@ -0,0 +1,46 @@
+"""PMClient retries, backoff and failure counting against the failure injecting PubMed stand-in"""
+import time
+import pytest
+import pmtool
+
+
+def client(retries: int):
+    return pmtool.PMClient(2, retries=retries, backoff=0.001, backoff_max=0.01)
+
+def test_retries_until_success(server):
+    server.fail_next = 2
+    c = client(3)
+    assert c.get(f"{server.url}?term=x").status_code == 200
+    assert (server.requests, server.failures) == (3, 2)
+    assert (c.stats["requests"], c.stats["retries"], c.stats["errors"]) == (3, 2, 2)
+
+def test_final_failure_raises_and_counts_every_error(server):
+    server.fail_next = 2
+    c = client(1)
+    with pytest.raises(pmtool.requests.HTTPError):
+        c.get(f"{server.url}?term=x")
+    assert (c.stats["requests"], c.stats["retries"], c.stats["errors"]) == (2, 1, 2)
+
+def test_retry_after_is_honored(server):
+    server.fail_status, server.retry_after, server.fail_next = 429, 1, 1
+    c = client(1)
+    t0 = time.perf_counter()
+    c.get(f"{server.url}?term=x")
+    assert time.perf_counter() - t0 >= 1
+    assert c.stats["retries"] == 1
+
+def test_connection_errors_are_retried(server):
+    server.fail_status, server.fail_next = 0, 1
+    c = client(2)
+    assert c.get(f"{server.url}?term=x").status_code == 200
+    assert (c.stats["requests"], c.stats["errors"]) == (2, 1)
+
+    server.fail_next = 3
+    with pytest.raises(pmtool.requests.ConnectionError):
+        c.get(f"{server.url}?term=x")
+
+def test_query_survives_random_failures(server):
+    server.fail_rate = 0.5
+    r = pmtool.pmquery("x", client=client(10))
+    assert len(list(pmtool.pmparse_iter(r['result']))) == len(server.records)
+    assert server.failures > 0
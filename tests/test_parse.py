@@ -0,0 +1,52 @@
+"""pmparse_iter against the original pmparse (bench/parse.py) and on author tags without FAU, JSON output"""
+import io
+import pytest
+import pmtool
+from corpus import generate
+from parse import reference
+
+OLD = """PMID- 1234
+TI  - An old record.
+AU  - Smith J
+AU  - Doe A
+AD  - Somewhere.
+DP  - 1998 Jan
+PT  - Journal Article
+SO  - J Old. 1998 Jan;1(1):1-2."""
+
+
+def test_same_as_original_pmparse():
+    txt = "\n\n".join(generate(200, seed=3))
+    articles = list(pmtool.pmparse_iter(txt))
+    assert len(articles) == 200 and articles == reference(txt)
+
+def test_authors_without_fau():
+    article = next(pmtool.pmparse_iter(OLD))
+    assert article['AUS'] == [{'AU': "Smith J"}, {'AU': "Doe A", 'AD': ["Somewhere."]}]
+    assert "Authors: Smith J, Doe A" in pmtool.pmformat(article, memo=False)
+
+def test_affiliation_before_any_author():
+    article = next(pmtool.pmparse_iter("PMID- 1\nAD  - Somewhere.\nAUID- ORCID: 1\nFAU - Smith, John\nAU  - Smith J"))
+    assert article['AUS'] == [{'AD': ["Somewhere."], 'AUID': "ORCID: 1"}, {'FAU': "Smith, John", 'AU': "Smith J"}]
+
+def test_compact_article_same_as_dict():
+    txt = "\n\n".join(generate(50, seed=4)) + "\n\n" + OLD
+    articles, compacts = list(pmtool.pmparse_iter(txt)), list(pmtool.pmparse_iter(txt, compact=True))
+    assert len(compacts) == len(articles) == 51
+    for article, compact in zip(articles, compacts):
+        assert compact.to_dict() == article
+        assert (compact['AUS'], compact['URL'], compact.get('MH')) == (article['AUS'], article['URL'], article.get('MH'))
+        assert pmtool._pmrender(compact, 'json') == pmtool._pmrender(article, 'json')
+
+@pytest.mark.parametrize("backend", ["json", "orjson"])
+def test_json_output_same_as_backend_dumps(backend, monkeypatch):
+    if backend == "orjson":
+        pytest.importorskip("orjson")
+    for name in ("_jsonbackend", "_dumps", "_loads", "_jsonseps"): # Restore the default backend afterwards
+        monkeypatch.setattr(pmtool, name, getattr(pmtool, name))
+    pmtool.pmjson(backend)
+    articles = list(pmtool.pmparse_iter("\n\n".join(generate(3))))
+    items = [{"user query": "x", "actual query": "x[All Fields]", "result": articles[:2]}, articles[2]]
+    of = io.StringIO()
+    pmtool.pmwrite(of, items, "json")
+    assert of.getvalue() == pmtool._dumps(items)
@@ -0,0 +1,96 @@
+"""Query pipeline against the local PubMed stand-in: paging, errors, record store, sync and merging"""
+import pytest
+import pmtool
+from corpus import generate
+from server import PMServer, PAGES
+
+
+def pmids(result):
+    return [a['PMID'] for a in (pmtool.pmparse_iter(result) if type(result) == str else result)]
+
+def test_pages_in_order(server):
+    r = pmtool.pmquery("x", concurrency=4)
+    assert pmids(r['result']) == pmids("\n\n".join(server.records))
+    assert server.requests == 3 # 450 records, 200 per page
+
+@pytest.mark.parametrize("engine", ["web", "eutils"])
+@pytest.mark.parametrize("n", [5, 10, 250, 400])
+def test_number_truncates_across_pages(server, engine, n):
+    assert pmids(pmtool.pmquery("x", n, engine=engine)['result']) == pmids("\n\n".join(server.records[:n]))
+
+def test_failed_query_does_not_stop_others(server):
+    server.fail_next = 1 # First page of the first query, one query and page at a time
+    rs = list(pmtool.pmqueries(["x", "30000001 30000002", "30000003"], parallel=1, concurrency=1, client=pmtool.PMClient(2, retries=0)))
+    assert [r['user query'] for r in rs] == ["x", "30000001 30000002", "30000003"]
+    assert "HTTPError" in rs[0]['error'] and rs[0]['result'] == ""
+    assert [pmids(r['result']) for r in rs[1:]] == [["30000001", "30000002"], ["30000003"]]
+    assert not any(r.get('error') for r in rs[1:])
+
+@pytest.mark.parametrize("engine", ["web", "eutils"])
+def test_store_fetches_each_record_once(server, tmp_path, engine):
+    store = pmtool.PMStore(str(tmp_path / "records.sqlite"))
+    queries = ["30000001 30000002 30000003", "30000002 30000003 30000004"]
+    rs = list(pmtool.pmqueries(queries, parallel=1, store=store, engine=engine))
+    assert [pmids(r['result']) for r in rs] == [q.split() for q in queries]
+    assert store.stats == {"hits": 2, "misses": 4}
+    assert store.db.execute("SELECT COUNT(*) FROM records").fetchone()[0] == 4
+
+    requests = server.requests
+    rs = list(pmtool.pmqueries(queries, parallel=1, store=store, engine=engine))
+    assert [pmids(r['result']) for r in rs] == [q.split() for q in queries]
+    assert store.stats == {"hits": 8, "misses": 4}
+    # Only resolving the queries to PMIDs, eutils with esearch and efetch
+    assert server.requests == requests + len(queries) * (2 if engine == "eutils" else 1)
+
+def results(records, *queries):
+    """Query result dicts of PMID only queries on records, PubMed format text as from `pmquery`"""
+    byid = {r.split("\n", 1)[0][6:]: r for r in records}
+    return [{"user query": q, "actual query": q, "result": "\n\n".join(byid[p] for p in q.split())} for q in queries]
+
+@pytest.mark.parametrize("op, expected", [
+    ("union", {"30000001": ["a"], "30000002": ["a", "b"], "30000003": ["a", "b", "c"], "30000004": ["b"], "30000005": ["c"]}),
+    ("intersection", {"30000003": ["a", "b", "c"]}),
+    ("difference", {"30000001": ["a"]}),
+])
+def test_pmmerge(records, op, expected):
+    a, b, c = "30000001 30000002 30000003", "30000002 30000003 30000004", "30000003 30000005"
+    names = {a: "a", b: "b", c: "c"}
+    merged = list(pmtool.pmmerge(results(records, a, b, c), op))
+    assert {m['PMID']: [names[q] for q in m['QUERIES']] for m in merged} == expected
+    assert [m['PMID'] for m in merged] == list(expected) # Order of first match
+
+def test_pmmerge_parses_each_record_once(records, monkeypatch):
+    parsed = []
+    parse = pmtool.pmparse_iter
+    monkeypatch.setattr(pmtool, "pmparse_iter", lambda src, *a: parsed.append(src) or parse(src, *a))
+    assert len(list(pmtool.pmmerge(results(records, "30000001 30000002", "30000002 30000001", "30000001"), "union"))) == 2
+    assert len(parsed) == 2
+
+def test_pmmerge_from_store(server, tmp_path):
+    store = pmtool.PMStore(str(tmp_path / "records.sqlite"))
+    rs = pmtool.pmqueries(["30000001 30000002", "30000002 30000003"], store=store)
+    merged = list(pmtool.pmmerge(rs, "intersection", store))
+    assert [(m['PMID'], m['QUERIES']) for m in merged] == [("30000002", ["30000001 30000002", "30000002 30000003"])]
+
+def test_sync_delta_is_not_served_from_cache(server, tmp_path):
+    cache, sync = pmtool.PMCache(str(tmp_path / "cache.sqlite")), pmtool.PMSync(str(tmp_path / "sync.sqlite"))
+    first = next(pmtool.pmqueries(["x"], cache=cache, sync=sync))
+    assert len(first['new']) == len(server.records)
+    # Same day runs have the same delta query, the cached pages of the first would hide the new record
+    next(pmtool.pmqueries(["x"], cache=cache, sync=sync))
+    server.records.append(added := next(generate(1, start=40000000)))
+    server.byid["40000000"] = added
+    r = next(pmtool.pmqueries(["x"], cache=cache, sync=sync, diff=True))
+    assert (r['new'], r['revised'], pmids(r['result'])) == (["40000000"], [], ["40000000"])
+
+def test_eutils_history_is_per_query(server, tmp_path):
+    store = pmtool.PMStore(str(tmp_path / "records.sqlite"))
+    r = pmtool.pmquery("30000001 30000002", engine="eutils", store=store)
+    assert r['pmids'] == ["30000001", "30000002"] and pmids(r['result']) == ["30000001", "30000002"]
+
+def test_recorded_page_replay(monkeypatch):
+    with PMServer([], PAGES) as s:
+        monkeypatch.setattr(pmtool, "PUBMED_URL", s.url)
+        r = pmtool.pmquery("anterior cruciate ligament[ti] AND reconstruction[ti]")
+    assert r['actual query'] == '"anterior cruciate ligament"[Title] AND "reconstruction"[Title]'
+    assert pmids(r['result']) == ["31281835", "31281900", "31281901"]
@@ -0,0 +1,56 @@
+"""Query translation of the local full text index and search over a small synthetic corpus"""
+import pytest
+import pmtool
+from corpus import generate
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("knee", '"knee"'),
+    ("knee[ti]", 'ti : "knee"'),
+    ("knee injury[tiab]", '{ti ab} : ("knee" "injury")'),
+    ("(mri OR imaging)[tiab]", '{ti ab} : ( "mri" OR "imaging" )'),
+    ("knee[ti] AND (mri OR imaging)[tiab] AND Polat B[au]", 'ti : "knee" AND {ti ab} : ( "mri" OR "imaging" ) AND au : "Polat B"'),
+    ('"magnetic resonance"[ti] NOT cancer[ab]', 'ti : "magnetic resonance" NOT ab : "cancer"'),
+    ("neopl*[mh]", 'mh : "neopl"*'),
+    ("30000005[pmid]", 'pmid : "30000005"'),
+    ("knee[all] OR (a OR b)", '"knee" OR ( "a" OR "b" )'),
+])
+def test_pmftsquery(q, expected):
+    assert pmtool.pmftsquery(q) == expected
+
+def test_pmftsquery_unknown_tag():
+    with pytest.raises(ValueError, match=r"\[xx\]"):
+        pmtool.pmftsquery("knee[xx]")
+
+@pytest.fixture
+def index(tmp_path):
+    index = pmtool.PMSearch(str(tmp_path / "index.db"))
+    index.add(pmtool.pmparse_iter("\n\n".join(generate(300, seed=2))))
+    yield index
+    index.close()
+
+def test_search_matches_fields(index):
+    articles = list(pmtool.pmparse_iter("\n\n".join(generate(300, seed=2))))
+    expected = {a['PMID'] for a in articles if "knee" in a['TI'].lower() and any(au['AU'] == "Polat B" for au in a['AUS'])}
+    r = index.search("knee[ti] AND Polat B[au]")
+    assert {a['PMID'] for a in r['result']} == expected and expected
+    assert [a['PMID'] for a in index.search("30000007[pmid]")['result']] == ["30000007"]
+
+def test_search_limit_replace_and_diacritics(index):
+    assert len(list(index.search("knee", 5)['result'])) == 5
+    assert list(index.search("ozturk[au]", 1)['result'])[0]['AUS'] # Matches Öztürk
+    index.add([{"PMID": "30000007", "TI": "Replaced title", "AUS": []}])
+    assert [a['TI'] for a in index.search("30000007[pmid]")['result']] == ["Replaced title"]
+    assert not list(index.search("replaced[ab]")['result'])
+
+def test_search_invalid_query(index):
+    with pytest.raises(ValueError):
+        index.search("knee AND")
+
+def test_duplicate_pmid_in_one_batch(tmp_path):
+    index = pmtool.PMSearch(str(tmp_path / "index.db"))
+    first, second = ({"PMID": "1", "TI": ti, "AUS": []} for ti in ("First title", "Second title"))
+    assert index.add([first, {"PMID": "2", "TI": "Other", "AUS": []}, second]) == 2
+    assert [a['TI'] for a in index.search("1[pmid]")['result']] == ["Second title"]
+    assert not list(index.search("first")['result'])
+    index.close()
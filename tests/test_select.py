@@ -0,0 +1,30 @@
+"""Selection of records by PMID through the sidecar byte offset index"""
+import os, sys, subprocess
+import pmtool
+from corpus import generate
+
+PMTOOL = pmtool.__file__
+
+
+def test_pmselect_in_requested_order(tmp_path, capsys):
+    path = tmp_path / "c.txt"
+    path.write_text("\n\n".join(generate(50)) + "\n", encoding="utf-8")
+    got = [a['PMID'] for a in pmtool.pmselect(str(path), ["30000042", "30000003", "1", "PMID:5"])]
+    assert got == ["30000042", "30000003"]
+    err = capsys.readouterr().err
+    assert "PMID not found: 1" in err and "PMID not found: PMID:5" in err
+    assert os.path.exists(f"{path}.pmidx")
+
+def test_pmid_rejects_xml_input(tmp_path):
+    path = tmp_path / "a.xml"
+    path.write_text("<PubmedArticleSet></PubmedArticleSet>\n", encoding="utf-8")
+    r = subprocess.run([sys.executable, PMTOOL, "-i", str(path), "--pmid", "1"], capture_output=True, text=True)
+    assert r.returncode != 0 and "not XML" in r.stderr
+    assert not os.path.exists(f"{path}.pmidx")
+
+def test_pmid_rejects_non_numeric(tmp_path):
+    path = tmp_path / "c.txt"
+    path.write_text("\n\n".join(generate(5)) + "\n", encoding="utf-8")
+    (pmid_file := tmp_path / "pmids.txt").write_text("PMID\n30000001\nPMID:30000002\n", encoding="utf-8")
+    r = subprocess.run([sys.executable, PMTOOL, "-i", str(path), "--pmid", "abc", "--pmid-file", str(pmid_file)], capture_output=True, text=True)
+    assert r.returncode != 0 and r.stderr.strip() == "Invalid PMIDs: abc, PMID, PMID:30000002"
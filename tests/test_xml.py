@@ -0,0 +1,128 @@
+"""PubMed XML input gives the same article dicts as PubMed format (trimmed sample record)"""
+import io
+import pmtool
+
+XML = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January 2024//EN" "https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_240101.dtd">
+<PubmedArticleSet>
+<PubmedBookArticle><BookDocument><PMID Version="1">20301295</PMID></BookDocument></PubmedBookArticle>
+<PubmedArticle>
+  <MedlineCitation Status="MEDLINE" Owner="NLM">
+    <PMID Version="1">31281835</PMID>
+    <DateCompleted><Year>2019</Year><Month>12</Month><Day>12</Day></DateCompleted>
+    <DateRevised><Year>2022</Year><Month>04</Month><Day>09</Day></DateRevised>
+    <Article PubModel="Electronic-eCollection">
+      <Journal>
+        <ISSN IssnType="Electronic">2314-6141</ISSN>
+        <JournalIssue CitedMedium="Internet"><Volume>2019</Volume><PubDate><Year>2019</Year></PubDate></JournalIssue>
+        <Title>BioMed research international</Title>
+      </Journal>
+      <ArticleTitle>Diagnostic Accuracy of Lever Sign Test in Acute, Chronic, and Postreconstructive ACL Injuries.</ArticleTitle>
+      <Pagination><MedlinePgn>3639693</MedlinePgn></Pagination>
+      <ELocationID EIdType="doi" ValidYN="Y">10.1155/2019/3639693</ELocationID>
+      <Abstract>
+        <AbstractText Label="BACKGROUND" NlmCategory="BACKGROUND">The aim of this study is to determine the diagnostic accuracy of <i>lever sign</i> test.</AbstractText>
+        <AbstractText Label="CONCLUSION" NlmCategory="CONCLUSIONS">The lever test seems to be a good test.</AbstractText>
+      </Abstract>
+      <AuthorList CompleteYN="Y">
+        <Author ValidYN="Y"><LastName>Gürpınar</LastName><ForeName>Tahsin</ForeName><Initials>T</Initials>
+          <AffiliationInfo><Affiliation>Istanbul Training and Research Hospital, Istanbul, Turkey.</Affiliation></AffiliationInfo></Author>
+        <Author ValidYN="Y"><LastName>Polat</LastName><ForeName>Barış</ForeName><Initials>B</Initials>
+          <Identifier Source="ORCID">0000-0001-8229-6412</Identifier>
+          <AffiliationInfo><Affiliation>University of Kyrenia, Kyrenia, Cyprus.</Affiliation></AffiliationInfo></Author>
+        <Author ValidYN="Y"><CollectiveName>ACL Study Group</CollectiveName></Author>
+      </AuthorList>
+      <Language>eng</Language>
+      <PublicationTypeList><PublicationType UI="D016428">Journal Article</PublicationType></PublicationTypeList>
+      <ArticleDate DateType="Electronic"><Year>2019</Year><Month>06</Month><Day>09</Day></ArticleDate>
+    </Article>
+    <MedlineJournalInfo><Country>United States</Country><MedlineTA>Biomed Res Int</MedlineTA><NlmUniqueID>101600173</NlmUniqueID></MedlineJournalInfo>
+    <CitationSubset>IM</CitationSubset>
+    <MeshHeadingList>
+      <MeshHeading><DescriptorName UI="D000208" MajorTopicYN="N">Acute Disease</DescriptorName></MeshHeading>
+      <MeshHeading><DescriptorName UI="D000070598" MajorTopicYN="N">Anterior Cruciate Ligament Injuries</DescriptorName>
+        <QualifierName UI="Q000175" MajorTopicYN="Y">diagnosis</QualifierName><QualifierName UI="Q000601" MajorTopicYN="Y">surgery</QualifierName></MeshHeading>
+      <MeshHeading><DescriptorName UI="D064385" MajorTopicYN="Y">Anterior Cruciate Ligament Reconstruction</DescriptorName></MeshHeading>
+    </MeshHeadingList>
+  </MedlineCitation>
+  <PubmedData>
+    <History>
+      <PubMedPubDate PubStatus="received"><Year>2019</Year><Month>2</Month><Day>11</Day></PubMedPubDate>
+      <PubMedPubDate PubStatus="entrez"><Year>2019</Year><Month>7</Month><Day>9</Day><Hour>6</Hour><Minute>0</Minute></PubMedPubDate>
+      <PubMedPubDate PubStatus="pubmed"><Year>2019</Year><Month>7</Month><Day>9</Day><Hour>6</Hour><Minute>0</Minute></PubMedPubDate>
+    </History>
+    <PublicationStatus>epublish</PublicationStatus>
+    <ArticleIdList>
+      <ArticleId IdType="pubmed">31281835</ArticleId>
+      <ArticleId IdType="doi">10.1155/2019/3639693</ArticleId>
+      <ArticleId IdType="pmc">PMC6590538</ArticleId>
+    </ArticleIdList>
+  </PubmedData>
+</PubmedArticle>
+<DeleteCitation><PMID Version="1">12345678</PMID></DeleteCitation>
+</PubmedArticleSet>
+"""
+
+PUBMED = """PMID- 31281835
+OWN - NLM
+STAT- MEDLINE
+DCOM- 20191212
+LR  - 20220409
+IS  - 2314-6141 (Electronic)
+VI  - 2019
+DP  - 2019
+TI  - Diagnostic Accuracy of Lever Sign Test in Acute, Chronic, and Postreconstructive 
+      ACL Injuries.
+PG  - 3639693
+LID - 10.1155/2019/3639693 [doi]
+AB  - BACKGROUND: The aim of this study is to determine the diagnostic accuracy of 
+      lever sign test. CONCLUSION: The lever test seems to be a good test.
+FAU - Gürpınar, Tahsin
+AU  - Gürpınar T
+AD  - Istanbul Training and Research Hospital, Istanbul, Turkey.
+FAU - Polat, Barış
+AU  - Polat B
+AUID- ORCID: 0000-0001-8229-6412
+AD  - University of Kyrenia, Kyrenia, Cyprus.
+CN  - ACL Study Group
+LA  - eng
+PT  - Journal Article
+DEP - 20190609
+PL  - United States
+TA  - Biomed Res Int
+JT  - BioMed research international
+JID - 101600173
+SB  - IM
+MH  - Acute Disease
+MH  - Anterior Cruciate Ligament Injuries/*diagnosis/*surgery
+MH  - *Anterior Cruciate Ligament Reconstruction
+PMC - PMC6590538
+EDAT- 2019/07/09 06:00
+CRDT- 2019/07/09 06:00
+PHST- 2019/02/11 00:00 [received]
+PHST- 2019/07/09 06:00 [entrez]
+PHST- 2019/07/09 06:00 [pubmed]
+AID - 10.1155/2019/3639693 [doi]
+PST - epublish
+SO  - Biomed Res Int. 2019;2019:3639693. doi: 10.1155/2019/3639693."""
+
+
+def test_same_article_as_pubmed_format():
+    articles = list(pmtool.pmparse_xml(io.BytesIO(XML.encode("utf-8"))))
+    assert articles == list(pmtool.pmparse_iter(PUBMED)) # Book article and deleted citation skipped
+    article = articles[0]
+    assert article['AUS'][1] == {'FAU': "Polat, Barış", 'AU': "Polat B", 'AUID': "ORCID: 0000-0001-8229-6412", 'AD': ["University of Kyrenia, Kyrenia, Cyprus."]}
+    assert article['URL'] == "https://pubmed.ncbi.nlm.nih.gov/31281835/"
+
+def test_markdown_output():
+    md = pmtool.pmformat(next(pmtool.pmparse_xml(io.BytesIO(XML.encode("utf-8")))), memo=False)
+    assert md.startswith("## Diagnostic Accuracy of Lever Sign Test in Acute, Chronic, and Postreconstructive ACL Injuries.\n")
+    assert "**Background:** The aim of this study is to determine the diagnostic accuracy of lever sign test." in md
+    assert "**Conclusion:** The lever test seems to be a good test." in md
+    assert "Authors: Gürpınar T, Polat B  \n" in md
+    assert "Source: Biomed Res Int. 2019;2019:3639693. doi: 10.1155/2019/3639693.  \n" in md
+    assert "[Full text](https://www.ncbi.nlm.nih.gov/pmc/articles/PMC6590538/)" in md
+
+def test_compact():
+    compact = list(pmtool.pmparse_xml(io.BytesIO(XML.encode("utf-8")), compact=True))
+    assert [a.to_dict() for a in compact] == list(pmtool.pmparse_iter(PUBMED))